@@ -8,27 +8,49 @@ Provides direct access to the occupancy decoder for voxel generation.
 
 import os
 import sys
+import copy
 import time
+import base64
+import queue
 import asyncio
 import logging
+import threading
+import functools
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from typing import Optional, List, Tuple
 from pathlib import Path
 
+# Set before torch initializes CUDA:
+# - expandable segments let the caching allocator grow blocks in place
+#   instead of fragmenting across differently sized query buffers
+# - safetensors-aware loaders read device-direct (see direct_weight_loading)
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+os.environ.setdefault("SAFETENSORS_FAST_GPU", "1")
+
 import torch
+import orjson
 import numpy as np
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 
 # Cube3D imports
 try:
     from cube3d.inference.engine import Engine, EngineFast
-    from cube3d.model.autoencoder.grid import generate_dense_grid_points
     CUBE3D_AVAILABLE = True
 except ImportError as e:
     CUBE3D_AVAILABLE = False
     IMPORT_ERROR = str(e)
 
+# Optional weight quantization for the occupancy decoder on CUDA
+try:
+    from torchao.quantization import quantize_, int8_weight_only, float8_weight_only
+    TORCHAO_AVAILABLE = True
+except ImportError:
+    TORCHAO_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -36,6 +58,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Occupancy decoder query batching (points per decoder call)
+DEFAULT_QUERY_BATCH_SIZE = 100_000
+MAX_QUERY_BATCH_SIZE = 4_194_304
+
+# Autocast dtypes for the occupancy decoder query (ROBOCUBE_QUERY_DTYPE)
+QUERY_DTYPES = {
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+    "fp32": torch.float32,
+}
+
+# Fixed query bbox; list forms are what the API responses carry
+_BBOX_MIN = np.array([-1.05, -1.05, -1.05], dtype=np.float32)
+_BBOX_MAX = np.array([1.05, 1.05, 1.05], dtype=np.float32)
+_BBOX_MIN_LIST = _BBOX_MIN.tolist()
+_BBOX_MAX_LIST = _BBOX_MAX.tolist()
+
+# Occupancy encodings for responses (OccupancyRequest.occupancy_format)
+OCCUPANCY_FORMATS = ("voxels", "packed", "bitmask", "auto")
+
 # =============================================================================
 # API Models
 # =============================================================================
@@ -59,6 +101,17 @@ class OccupancyRequest(BaseModel):
         None,
         description="Base RGB color [r, g, b] in 0-1 range for color modes"
     )
+    occupancy_format: str = Field(
+        "voxels",
+        description="Occupancy encoding: 'voxels' ([x,y,z] list), 'packed' (base64 integer "
+                    "triplets), 'bitmask' (packed bits), or 'auto' (voxels or bitmask, whichever "
+                    "is smaller)"
+    )
+    hierarchical: bool = Field(
+        False,
+        description="Coarse-to-fine query: only evaluate points near a 4x coarser occupancy pass "
+                    "(unqueried logits are -inf)"
+    )
 
 
 class GenerationMetadata(BaseModel):
@@ -78,7 +131,25 @@ class OccupancyResult(BaseModel):
         None,
         description="RGB colors for each voxel [[r,g,b], ...] in 0-1 range, same order as occupied_voxels"
     )
-    logits: Optional[List[float]] = Field(None, description="Raw occupancy logits (resolution^3 values)")
+    logits: Optional[List[float]] = Field(
+        None,
+        description="Raw occupancy logits (resolution^3 values); only with ?legacy_logits=true"
+    )
+    logits_b64: Optional[str] = Field(None, description="Raw occupancy logits as base64 little-endian bytes")
+    logits_dtype: Optional[str] = Field(None, description="Element type of logits_b64, e.g. 'float16'")
+    logits_shape: Optional[List[int]] = Field(None, description="Shape of logits_b64 [nx, ny, nz]")
+    occupancy_format: str = Field("voxels", description="Encoding used for occupancy: 'voxels' or 'bitmask'")
+    voxels_b64: Optional[str] = Field(
+        None,
+        description="Base64 occupied voxels as interleaved (x, y, z) integers; occupied_voxels is empty when set"
+    )
+    voxels_dtype: Optional[str] = Field(None, description="Element type of voxels_b64: 'uint8' or 'uint16'")
+    voxels_shape: Optional[List[int]] = Field(None, description="Shape of voxels_b64 [N, 3]")
+    occupancy_bitmask: Optional[str] = Field(
+        None,
+        description="Base64 occupancy bits (LSB first) in flat grid order, same layout as logits; "
+                    "occupied_voxels is empty when set"
+    )
     metadata: Optional[GenerationMetadata] = None
 
 
@@ -97,16 +168,95 @@ class HealthResponse(BaseModel):
 # Server State
 # =============================================================================
 
+class RngGate:
+    """
+    Shares the device RNG between unseeded GPT runs, but gives a seeded run
+    it alone.
+
+    Pooled engines all draw from the same global generator, so a seeded run
+    must not overlap any other run or its tokens depend on what else was in
+    flight. Seeded runs wait for the running ones to finish (new unseeded
+    runs queue behind a waiting seeded one), seed inside a forked RNG state,
+    and restore it afterwards.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.active = 0
+        self.seeded_waiting = 0
+        self.seeded_running = False
+
+    @contextlib.contextmanager
+    def hold(self, seed: Optional[int], device: torch.device):
+        if seed is None:
+            with self.cond:
+                self.cond.wait_for(lambda: not self.seeded_running and self.seeded_waiting == 0)
+                self.active += 1
+            try:
+                yield
+            finally:
+                with self.cond:
+                    self.active -= 1
+                    self.cond.notify_all()
+            return
+
+        with self.cond:
+            self.seeded_waiting += 1
+            self.cond.wait_for(lambda: not self.seeded_running and self.active == 0)
+            self.seeded_waiting -= 1
+            self.seeded_running = True
+        try:
+            cuda_devices = [device.index if device.index is not None else torch.cuda.current_device()] \
+                if device.type == "cuda" else []
+            with torch.random.fork_rng(devices=cuda_devices):
+                # Only the RNG of the sampling device matters (NumPy's is never used)
+                if cuda_devices:
+                    torch.cuda.manual_seed(seed)
+                else:
+                    torch.manual_seed(seed)
+                yield
+        finally:
+            with self.cond:
+                self.seeded_running = False
+                self.cond.notify_all()
+
+
 class ServerState:
     """Global server state for model management"""
     def __init__(self):
         self.engine = None
         self.shape_model = None
         self.gpt_model = None
+        self.max_code_index = None
+        self.device = None
         self.loading = False
         self.error = None
         self.start_time = time.time()
         self.model_version = "cube3d-v0.5"
+        self.query_batch_size = DEFAULT_QUERY_BATCH_SIZE
+        self.query_dtype = QUERY_DTYPES.get(os.getenv("ROBOCUBE_QUERY_DTYPE", "bf16"), torch.bfloat16)
+        self.gpt_batching = True
+        self.grid_cache = {}
+        self.use_cuda_graphs = os.getenv("ROBOCUBE_CUDA_GRAPHS", "1") == "1"
+        self.query_graphs = {}
+        self.query_graphs_lock = threading.Lock()
+        self.batcher = None
+        # LRU caches for repeated deterministic requests
+        self.cache_size = int(os.getenv("ROBOCUBE_RESULT_CACHE", "32"))
+        self.cache_lock = threading.Lock()
+        self.latents_cache = OrderedDict()
+        self.result_cache = OrderedDict()
+        # CUDA streams for occupancy queries and logit readback (None off CUDA)
+        self.query_stream = None
+        self.copy_stream = None
+        # GPT engines sharing one shape model; each runs one request at a time
+        self.engine_pool_size = max(1, int(os.getenv("ROBOCUBE_ENGINE_POOL", "1")))
+        self.engine_pool = queue.Queue()
+        # Blocking GPU work runs here rather than on the shared default
+        # executor; one worker per pooled engine
+        self.gpu_executor = ThreadPoolExecutor(max_workers=self.engine_pool_size, thread_name_prefix="gpu")
+        # Keeps seeded GPT runs alone on the shared device RNG
+        self.rng_gate = RngGate()
 
     @property
     def models_loaded(self) -> bool:
@@ -121,7 +271,8 @@ state = ServerState()
 app = FastAPI(
     title="Cube3D Occupancy Server",
     description="FastAPI server for Cube3D text-to-voxel generation via occupancy field",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -168,36 +319,106 @@ async def load_models():
             raise RuntimeError(f"Shape checkpoint not found: {shape_ckpt}")
 
         logger.info(f"Loading models from {model_dir}")
+        prefetch_checkpoints([gpt_ckpt, shape_ckpt])
 
         # Use EngineFast on CUDA, Engine on CPU
-        if device.type == "cuda":
-            try:
-                state.engine = EngineFast(
-                    str(config_path),
-                    str(gpt_ckpt),
-                    str(shape_ckpt),
-                    device=device
-                )
-                logger.info("EngineFast loaded successfully")
-            except Exception as e:
-                logger.warning(f"EngineFast failed: {e}, falling back to Engine")
+        with direct_weight_loading(device):
+            if device.type == "cuda":
+                try:
+                    state.engine = EngineFast(
+                        str(config_path),
+                        str(gpt_ckpt),
+                        str(shape_ckpt),
+                        device=device
+                    )
+                    logger.info("EngineFast loaded successfully")
+                except Exception as e:
+                    logger.warning(f"EngineFast failed: {e}, falling back to Engine")
+                    state.engine = Engine(
+                        str(config_path),
+                        str(gpt_ckpt),
+                        str(shape_ckpt),
+                        device=device
+                    )
+            else:
                 state.engine = Engine(
                     str(config_path),
                     str(gpt_ckpt),
                     str(shape_ckpt),
                     device=device
                 )
-        else:
-            state.engine = Engine(
-                str(config_path),
-                str(gpt_ckpt),
-                str(shape_ckpt),
-                device=device
-            )
 
         # Get references to sub-models for direct access
         state.shape_model = state.engine.shape_model
         state.gpt_model = state.engine.gpt_model
+        state.max_code_index = state.shape_model.cfg.num_codes - 1
+        state.device = device
+        state.query_stream = torch.cuda.Stream(device) if device.type == "cuda" else None
+        state.copy_stream = torch.cuda.Stream(device) if device.type == "cuda" else None
+
+        # Memoize prompt embeddings (ROBOCUBE_TEXT_CACHE entries, 0 disables)
+        text_cache_size = int(os.getenv("ROBOCUBE_TEXT_CACHE", "128"))
+        if text_cache_size > 0:
+            install_text_embedding_cache(state.engine, text_cache_size)
+        state.engine_pool.put(state.engine)
+
+        # Extra GPT engines for concurrent generation (ROBOCUBE_ENGINE_POOL).
+        # They share every loaded model with the first engine (see
+        # make_pooled_engine), so nothing is loaded twice.
+        for i in range(1, state.engine_pool_size):
+            state.engine_pool.put(make_pooled_engine(state.engine))
+            logger.info(f"Added pooled engine {i + 1}/{state.engine_pool_size}")
+
+        # Optionally switch 4D weights to channels-last for A/B runs
+        # (ROBOCUBE_CHANNELS_LAST=1). Linear and 3D weights are unaffected.
+        if os.getenv("ROBOCUBE_CHANNELS_LAST", "0") == "1":
+            num_4d = sum(1 for p in state.shape_model.parameters() if p.dim() == 4)
+            state.shape_model.to(memory_format=torch.channels_last)
+            logger.info(f"Channels-last shape model: {num_4d} 4D weight tensors converted")
+
+        # Optionally quantize the occupancy decoder (ROBOCUBE_QUANTIZE)
+        quantize_mode = os.getenv("ROBOCUBE_QUANTIZE", "")
+        if quantize_mode:
+            quantize_occupancy_decoder(device, quantize_mode)
+
+        state.query_batch_size = tune_query_batch_size(device)
+        logger.info(f"Occupancy query batch size: {state.query_batch_size}")
+
+        # Optionally compile the occupancy decoder query with inductor.
+        # reduce-overhead mode captures its own CUDA graphs, so the manual
+        # QueryGraph path is switched off when compiling.
+        if device.type == "cuda" and os.getenv("ROBOCUBE_COMPILE", "0") == "1":
+            state.shape_model.query = torch.compile(
+                state.shape_model.query,
+                mode="reduce-overhead",
+                fullgraph=False,
+                dynamic=False,
+            )
+            state.use_cuda_graphs = False
+
+        # Reuse latent-only projections across eager query batches (skipped
+        # when compiling so dynamo does not trace the Python-side cache), as
+        # long as a probe query gives the same logits with and without it
+        elif (getattr(state.shape_model, "occupancy_decoder", None) is not None
+              and os.getenv("ROBOCUBE_LATENT_MEMO", "1") == "1"):
+            patched = install_latent_memo(state.shape_model.occupancy_decoder)
+            if check_latent_memo(device):
+                logger.info(f"Latent memo installed on {len(patched)} occupancy decoder modules")
+            else:
+                logger.warning("Memoized occupancy queries differ from plain ones - latent memo disabled")
+                for sub, forward in patched:
+                    sub.forward = forward
+
+        # Compile / capture the query for each tile shape clients are expected
+        # to use, so the first real request at those resolutions does not pay
+        # for it (ROBOCUBE_WARMUP_RESOLUTIONS, comma separated; empty disables)
+        if device.type == "cuda" and (state.use_cuda_graphs or os.getenv("ROBOCUBE_COMPILE", "0") == "1"):
+            warmup_start = time.time()
+            dummy_latents = make_dummy_latents(device)
+            for value in os.getenv("ROBOCUBE_WARMUP_RESOLUTIONS", "32,64,128").split(","):
+                if value.strip():
+                    query_occupancy(dummy_latents, int(value))
+            logger.info(f"Warmed up occupancy queries in {time.time() - warmup_start:.1f}s")
 
         logger.info("Model loading complete")
         state.error = None
@@ -211,14 +432,224 @@ async def load_models():
         state.loading = False
 
 
+def prefetch_checkpoints(paths: List[Path]):
+    """
+    Ask the kernel to start reading checkpoint files into the page cache.
+
+    cube3d loads the checkpoints one after another inside the engine
+    constructor. POSIX_FADV_WILLNEED queues asynchronous readahead for
+    every file up front, so the disk reads overlap with each other and with
+    model construction. No-op where posix_fadvise is unavailable.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.warning(f"Checkpoint prefetch failed for {path}: {e}")
+
+
+@contextlib.contextmanager
+def direct_weight_loading(target: torch.device):
+    """
+    Load safetensors checkpoints straight into device memory during engine init.
+
+    cube3d reads checkpoints with safetensors' load_file, which stages every
+    tensor in host RAM before the model is moved to the GPU. While active,
+    load_file defaults to `target` and modules are created on `target`, so
+    load_state_dict copies device-to-device. No-op off CUDA, with
+    ROBOCUBE_DIRECT_LOAD=0, or if cube3d does not load through load_file.
+    """
+    cube3d_utils = sys.modules.get("cube3d.inference.utils")
+    original = getattr(cube3d_utils, "load_file", None)
+    if target.type != "cuda" or os.getenv("ROBOCUBE_DIRECT_LOAD", "1") != "1" or original is None:
+        logger.info("Loading checkpoints via host memory")
+        yield
+        return
+
+    def load_file(filename, device="cpu"):
+        return original(filename, device=str(target) if str(device) == "cpu" else device)
+
+    logger.info(f"Loading checkpoints directly to {target}")
+    cube3d_utils.load_file = load_file
+    try:
+        with torch.device(target):
+            yield
+    finally:
+        cube3d_utils.load_file = original
+
+
+def make_pooled_engine(engine):
+    """
+    Make an extra GPT engine that shares `engine`'s loaded models.
+
+    cube3d's Engine.run_gpt allocates its KV cache per call and otherwise only
+    reads the GPT, shape and text models, so a plain Engine over the same
+    attributes can decode concurrently with `engine`. EngineFast instead
+    decodes through one captured CUDA graph over a static KV cache owned by
+    the instance, so pooled engines always take the plain Engine path. The
+    prompt embedding cache (a patched run_clip) is shared as well.
+    """
+    pooled = Engine.__new__(Engine)
+    pooled.__dict__.update(engine.__dict__)
+    return pooled
+
+
+def install_text_embedding_cache(engine, maxsize: int):
+    """
+    Memoize the engine's text encoder per prompt (LRU, `maxsize` entries).
+
+    cube3d encodes the prompts, plus an empty prompt for classifier-free
+    guidance, through `engine.run_clip` on every run_gpt call. Embeddings are
+    cached per prompt on the device and concatenated back in order, so only
+    unseen prompts reach the encoder. Engines without run_clip are left as-is.
+    """
+    run_clip = getattr(engine, "run_clip", None)
+    if run_clip is None:
+        logger.warning("Engine has no run_clip - text embedding cache disabled")
+        return
+
+    cache = OrderedDict()
+    lock = threading.Lock()
+
+    def cached_run_clip(text_inputs):
+        prompts = list(text_inputs)
+        rows = {}
+        with lock:
+            for prompt in prompts:
+                if prompt in cache:
+                    cache.move_to_end(prompt)
+                    rows[prompt] = cache[prompt]
+
+        missing = [p for p in dict.fromkeys(prompts) if p not in rows]
+        if missing:
+            encoded = run_clip(missing)
+            with lock:
+                for i, prompt in enumerate(missing):
+                    rows[prompt] = cache[prompt] = encoded[i:i + 1].clone()
+                    cache.move_to_end(prompt)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+        return torch.cat([rows[p] for p in prompts], dim=0)
+
+    engine.run_clip = cached_run_clip
+    logger.info(f"Text embedding cache enabled ({maxsize} prompts)")
+
+
+def make_dummy_latents(device: torch.device) -> torch.Tensor:
+    """Decode all-zero shape tokens into latents for probing and warmup"""
+    num_latents = state.shape_model.cfg.num_encoder_latents
+    with torch.inference_mode():
+        shape_ids = torch.zeros(1, num_latents, dtype=torch.long, device=device)
+        return state.shape_model.decode_indices(shape_ids)
+
+
+def quantize_occupancy_decoder(device: torch.device, mode: str):
+    """
+    Quantize the occupancy decoder's Linear weights to 8 bits.
+
+    On CUDA this uses torchao weight-only quantization ('int8' or 'fp8');
+    on CPU, dynamic int8 quantization from torch.ao. Occupancy is a
+    threshold decision, so the quantized decoder is checked against the
+    original on a 32^3 grid with dummy latents and reverted if more than 1%
+    of the occupancy decisions change.
+    """
+    decoder = getattr(state.shape_model, "occupancy_decoder", None)
+    if decoder is None:
+        logger.warning("Shape model has no occupancy_decoder - skipping quantization")
+        return
+    if device.type == "cuda" and not TORCHAO_AVAILABLE:
+        logger.warning("torchao not installed - skipping occupancy decoder quantization")
+        return
+    if mode not in ("int8", "fp8") or (mode == "fp8" and device.type != "cuda"):
+        logger.warning(f"Unsupported ROBOCUBE_QUANTIZE mode '{mode}' on {device.type}")
+        return
+
+    with torch.inference_mode():
+        latents, query_dtype, use_autocast = prepare_query_latents(make_dummy_latents(device))
+        points = make_grid_on_device(_BBOX_MIN, _BBOX_MAX, 32, device).unsqueeze(0)
+
+    def probe():
+        with torch.inference_mode(), torch.autocast(device_type=device.type, dtype=query_dtype, enabled=use_autocast):
+            return state.shape_model.query(points, latents).squeeze(0) > 0.0
+
+    # The backup and the quantized weights are made outside inference mode:
+    # inference-tensor parameters could not be moved or modified in place later
+    reference = probe()
+    with torch.no_grad():
+        original = copy.deepcopy(decoder)
+        if device.type == "cuda":
+            quantize_(decoder, int8_weight_only() if mode == "int8" else float8_weight_only())
+        else:
+            state.shape_model.occupancy_decoder = torch.ao.quantization.quantize_dynamic(
+                decoder, {torch.nn.Linear}, dtype=torch.qint8
+            )
+    mismatch = (probe() != reference).float().mean().item()
+
+    if mismatch > 0.01:
+        logger.warning(
+            f"{mode} occupancy decoder changed {100 * mismatch:.2f}% of probe voxels, keeping full precision"
+        )
+        state.shape_model.occupancy_decoder = original
+    else:
+        logger.info(f"Quantized occupancy decoder to {mode} ({100 * mismatch:.2f}% probe voxels changed)")
+
+
+def tune_query_batch_size(device: torch.device) -> int:
+    """
+    Pick the number of points per occupancy decoder call.
+
+    ROBOCUBE_QUERY_BATCH overrides the choice. On CUDA, a probe query with
+    dummy latents measures the VRAM cost per point and the batch is sized to
+    use half of the free memory, so large grids need far fewer launches.
+    Falls back to the default batch size on CPU or if probing fails.
+    """
+    override = os.getenv("ROBOCUBE_QUERY_BATCH")
+    if override:
+        return int(override)
+    if device.type != "cuda":
+        return DEFAULT_QUERY_BATCH_SIZE
+
+    try:
+        # Probe in the same precision the queries will run in
+        with torch.inference_mode():
+            latents, query_dtype, use_autocast = prepare_query_latents(make_dummy_latents(device))
+            points = torch.zeros(1, DEFAULT_QUERY_BATCH_SIZE, 3, device=device)
+
+            torch.cuda.synchronize(device)
+            torch.cuda.reset_peak_memory_stats(device)
+            baseline = torch.cuda.memory_allocated(device)
+            with torch.autocast(device_type="cuda", dtype=query_dtype, enabled=use_autocast):
+                state.shape_model.query(points, latents)
+            torch.cuda.synchronize(device)
+            probe_bytes = torch.cuda.max_memory_allocated(device) - baseline
+
+        del latents, points
+        torch.cuda.empty_cache()
+
+        bytes_per_point = max(probe_bytes / DEFAULT_QUERY_BATCH_SIZE, 1.0)
+        free_bytes, _ = torch.cuda.mem_get_info(device)
+        batch_size = int(0.5 * free_bytes / bytes_per_point)
+        return max(DEFAULT_QUERY_BATCH_SIZE, min(batch_size, MAX_QUERY_BATCH_SIZE))
+
+    except Exception as e:
+        logger.warning(f"Query batch size probe failed: {e}, using default")
+        return DEFAULT_QUERY_BATCH_SIZE
+
+
 def generate_voxel_colors(
-    occupied_voxels: List[List[int]],
-    logits_np: np.ndarray,
-    occupied_indices: np.ndarray,
+    occupied_voxels: np.ndarray,
+    occupied_logits: Optional[np.ndarray],
     nx: int, ny: int, nz: int,
     color_mode: str,
     base_color: Tuple[float, float, float],
-) -> List[List[float]]:
+) -> np.ndarray:
     """
     Generate RGB colors for occupied voxels based on color mode.
 
@@ -229,226 +660,663 @@ def generate_voxel_colors(
     - 'solid': Use base_color for all voxels
 
     Args:
-        occupied_voxels: List of [x, y, z] voxel positions
-        logits_np: Raw occupancy logits for all grid points
-        occupied_indices: Indices of occupied voxels in the logits array
+        occupied_voxels: Voxel positions [N, 3] as (x, y, z)
+        occupied_logits: Occupancy logits of the occupied voxels (required for 'density')
         nx, ny, nz: Grid dimensions
         color_mode: Color generation mode
         base_color: Base RGB color (r, g, b) in 0-1 range
 
     Returns:
-        List of [r, g, b] colors for each occupied voxel
+        float32 array [N, 3] of (r, g, b) colors, one per occupied voxel
     """
-    if not occupied_voxels:
-        return []
-
-    colors = []
-    base_r, base_g, base_b = base_color
+    vox = np.asarray(occupied_voxels, dtype=np.float32).reshape(-1, 3)
+    base = np.asarray(base_color, dtype=np.float32)
+    if len(vox) == 0:
+        return np.empty((0, 3), dtype=np.float32)
 
     if color_mode == 'solid':
         # Use base color for all voxels
-        for _ in occupied_voxels:
-            colors.append([base_r, base_g, base_b])
+        return np.tile(base, (len(vox), 1))
 
     elif color_mode == 'height':
         # Color varies with Y coordinate (vertical gradient)
         # Normalize Y to 0-1 range
-        y_coords = [v[1] for v in occupied_voxels]
-        y_min, y_max = min(y_coords), max(y_coords)
-        y_range = max(y_max - y_min, 1)
-
-        for voxel in occupied_voxels:
-            t = (voxel[1] - y_min) / y_range
-            # Gradient from darker at bottom to brighter at top
-            r = base_r * (0.5 + 0.5 * t)
-            g = base_g * (0.5 + 0.5 * t)
-            b = base_b * (0.5 + 0.5 * t)
-            colors.append([min(1.0, r), min(1.0, g), min(1.0, b)])
+        y = vox[:, 1]
+        y_min = y.min()
+        y_range = max(y.max() - y_min, 1)
+        t = (y - y_min) / y_range
+        # Gradient from darker at bottom to brighter at top
+        return np.minimum(base[None, :] * (0.5 + 0.5 * t)[:, None], 1.0)
 
     elif color_mode == 'radial':
         # Color varies with distance from center
-        center_x, center_y, center_z = nx / 2, ny / 2, nz / 2
-
-        # Calculate max distance for normalization
-        max_dist = 0.0
-        for voxel in occupied_voxels:
-            dx = voxel[0] - center_x
-            dy = voxel[1] - center_y
-            dz = voxel[2] - center_z
-            dist = (dx*dx + dy*dy + dz*dz) ** 0.5
-            max_dist = max(max_dist, dist)
-        max_dist = max(max_dist, 1.0)
-
-        for voxel in occupied_voxels:
-            dx = voxel[0] - center_x
-            dy = voxel[1] - center_y
-            dz = voxel[2] - center_z
-            dist = (dx*dx + dy*dy + dz*dz) ** 0.5
-            t = dist / max_dist
-            # Gradient from base color at center to darker at edges
-            r = base_r * (1.0 - 0.4 * t)
-            g = base_g * (1.0 - 0.4 * t)
-            b = base_b * (1.0 - 0.4 * t)
-            colors.append([max(0.0, r), max(0.0, g), max(0.0, b)])
+        center = np.array([nx / 2, ny / 2, nz / 2], dtype=np.float32)
+        dist = np.linalg.norm(vox - center, axis=1)
+        max_dist = max(dist.max(), 1.0)
+        t = dist / max_dist
+        # Gradient from base color at center to darker at edges
+        return np.maximum(base[None, :] * (1.0 - 0.4 * t)[:, None], 0.0)
 
     elif color_mode == 'density':
         # Color varies with occupancy logit value (confidence)
         # Higher logit = more saturated/brighter color
-        occupied_logits = logits_np[occupied_indices]
-        logit_min, logit_max = occupied_logits.min(), occupied_logits.max()
-        logit_range = max(logit_max - logit_min, 1e-6)
-
-        for i, voxel in enumerate(occupied_voxels):
-            t = (occupied_logits[i] - logit_min) / logit_range
-            # Higher confidence = more saturated
-            r = base_r * (0.4 + 0.6 * t)
-            g = base_g * (0.4 + 0.6 * t)
-            b = base_b * (0.4 + 0.6 * t)
-            colors.append([min(1.0, r), min(1.0, g), min(1.0, b)])
+        logits = np.asarray(occupied_logits, dtype=np.float32)
+        logit_min = logits.min()
+        logit_range = max(logits.max() - logit_min, 1e-6)
+        t = (logits - logit_min) / logit_range
+        # Higher confidence = more saturated
+        return np.minimum(base[None, :] * (0.4 + 0.6 * t)[:, None], 1.0)
 
     else:
         # Unknown mode, use solid base color
         logger.warning(f"Unknown color mode '{color_mode}', using solid color")
-        for _ in occupied_voxels:
-            colors.append([base_r, base_g, base_b])
+        return np.tile(base, (len(vox), 1))
 
-    return colors
 
+@contextlib.contextmanager
+def checkout_engine():
+    """Borrow a GPT engine from the pool, blocking until one is free"""
+    engine = state.engine_pool.get()
+    try:
+        yield engine
+    finally:
+        state.engine_pool.put(engine)
 
-def generate_occupancy_field(
-    prompt: str,
-    resolution: int,
+
+def cache_get(cache: OrderedDict, key):
+    """Look up an LRU cache entry, marking it most recently used"""
+    with state.cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def cache_put(cache: OrderedDict, key, value):
+    """Insert an LRU cache entry, evicting the oldest beyond state.cache_size"""
+    with state.cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > state.cache_size:
+            cache.popitem(last=False)
+
+
+def generate_latents(
+    prompts: List[str],
     seed: Optional[int] = None,
     guidance_scale: float = 3.0,
     top_p: Optional[float] = None,
     bounding_box_xyz: Optional[Tuple[float, float, float]] = None,
-    threshold: float = 0.0,
-    include_logits: bool = False,
-    color_mode: Optional[str] = None,
-    base_color: Optional[Tuple[float, float, float]] = None,
-) -> OccupancyResult:
+) -> torch.Tensor:
     """
-    Generate occupancy field from text prompt.
+    Run GPT and the shape decoder for a batch of prompts.
 
-    Directly queries the shape model's occupancy decoder at discrete grid points
-    instead of extracting a mesh.
+    All prompts share the same sampling parameters. Returns latents with one
+    row per prompt, ready for occupancy queries. Deterministic requests
+    (seeded, or greedy with top_p=None) are served from `state.latents_cache`
+    when the same prompt and parameters were generated before.
     """
-    start_time = time.time()
-
     if not state.models_loaded:
         raise RuntimeError("Models not loaded")
 
-    device = next(state.shape_model.parameters()).device
-
-    # Set seed for reproducibility
-    if seed is not None:
-        torch.manual_seed(seed)
-        np.random.seed(seed)
-        if torch.cuda.is_available():
-            torch.cuda.manual_seed_all(seed)
-
+    if state.cache_size <= 0 or (seed is None and top_p is not None):
+        return sample_latents(prompts, seed, guidance_scale, top_p, bounding_box_xyz)
+
+    keys = [(p, seed, guidance_scale, top_p, bounding_box_xyz) for p in prompts]
+    rows = [cache_get(state.latents_cache, key) for key in keys]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if len(missing) < len(prompts):
+        logger.info(f"Reusing cached latents for {len(prompts) - len(missing)} prompt(s)")
+
+    if missing:
+        latents = sample_latents([prompts[i] for i in missing], seed, guidance_scale, top_p, bounding_box_xyz)
+        for j, i in enumerate(missing):
+            rows[i] = latents[j:j + 1].clone()
+            cache_put(state.latents_cache, keys[i], rows[i])
+
+    return torch.cat(rows, dim=0)
+
+
+def sample_latents(
+    prompts: List[str],
+    seed: Optional[int],
+    guidance_scale: float,
+    top_p: Optional[float],
+    bounding_box_xyz: Optional[Tuple[float, float, float]],
+) -> torch.Tensor:
+    """Run GPT and decode shape tokens to latents (uncached, see generate_latents)"""
+    # Seeded runs get the device RNG to themselves, so they reproduce
+    # regardless of what other pooled engines are doing
+    with state.rng_gate.hold(seed, state.device):
+        return _sample_latents(prompts, guidance_scale, top_p, bounding_box_xyz)
+
+
+def _sample_latents(
+    prompts: List[str],
+    guidance_scale: float,
+    top_p: Optional[float],
+    bounding_box_xyz: Optional[Tuple[float, float, float]],
+) -> torch.Tensor:
+    """Body of sample_latents, run inside the request's RNG scope"""
     # Step 1: Run GPT to generate shape tokens
-    logger.info(f"Generating shape tokens for: {prompt[:50]}...")
+    logger.info(f"Generating shape tokens for {len(prompts)} prompt(s): {prompts[0][:50]}...")
 
-    with torch.no_grad():
+    with torch.inference_mode():
         # Generate shape tokens using Engine's run_gpt
         # This handles text encoding and GPT generation internally
-        shape_ids = state.engine.run_gpt(
-            [prompt],
+        gpt_kwargs = dict(
             use_kv_cache=True,  # Faster generation
             guidance_scale=guidance_scale,
             top_p=top_p,
             bounding_box_xyz=bounding_box_xyz,
         )
+        with checkout_engine() as engine:
+            if len(prompts) > 1 and state.gpt_batching:
+                try:
+                    shape_ids = engine.run_gpt(prompts, **gpt_kwargs)
+                except (AssertionError, RuntimeError) as e:
+                    # Some engines (e.g. CUDA-graph based) only support batch size 1
+                    logger.warning(f"Batched run_gpt failed ({e}), generating prompts one at a time")
+                    state.gpt_batching = False
+            if len(prompts) == 1 or not state.gpt_batching:
+                shape_ids = torch.cat([engine.run_gpt([p], **gpt_kwargs) for p in prompts], dim=0)
 
         logger.info(f"Generated {shape_ids.shape[1]} shape tokens")
 
         # Step 2: Decode shape tokens to latent representation
-        # Clamp indices to valid codebook range
-        num_codes = state.shape_model.cfg.num_codes
-        shape_ids = shape_ids.clamp(0, num_codes - 1)
+        # Clamp indices to valid codebook range (in place, bound cached at load)
+        shape_ids.clamp_(0, state.max_code_index)
 
         # Get latent representation from shape decoder
         latents = state.shape_model.decode_indices(shape_ids)
 
         logger.info(f"Decoded to latent shape: {latents.shape}")
 
-        # Step 3: Generate grid points and query occupancy decoder
-        # Use cube3d's grid generation function
-        bbox_min = np.array([-1.05, -1.05, -1.05], dtype=np.float32)
-        bbox_max = np.array([1.05, 1.05, 1.05], dtype=np.float32)
+    return latents
+
+
+def make_grid_on_device(
+    bbox_min: np.ndarray,
+    bbox_max: np.ndarray,
+    resolution: int,
+    device: torch.device,
+) -> torch.Tensor:
+    """
+    Build the dense query grid [(resolution + 1)^3, 3] directly on `device`.
+
+    Same points and order as cube3d's generate_dense_grid_points with 'ij'
+    indexing (linspace per axis in float64, cast to float32), without the
+    NumPy allocation and host-to-device copy.
+    """
+    axes = [
+        torch.linspace(float(lo), float(hi), resolution + 1, dtype=torch.float64, device=device).float()
+        for lo, hi in zip(bbox_min, bbox_max)
+    ]
+    xs, ys, zs = torch.meshgrid(*axes, indexing='ij')
+    return torch.stack([xs, ys, zs], dim=-1).reshape(-1, 3)
+
+
+def get_dense_grid(resolution: int, device: torch.device):
+    """
+    Return the dense query grid for a resolution, building it on first use.
+
+    The bbox is fixed, so grids are cached per resolution (and query batch
+    size) in `state.grid_cache` and kept on the device, skipping the meshgrid
+    and host-to-device copy on every request. Points are pre-tiled into
+    fixed-shape decoder batches; the last tile is zero-padded, so callers
+    ignore anything past num_points.
+
+    Returns:
+        (grid_tiles [num_batches, batch_size, 3] on device, num_points, grid_size [nx, ny, nz])
+    """
+    key = (resolution, state.query_batch_size)
+    cached = state.grid_cache.get(key)
+    if cached is not None:
+        return cached
+
+    n = int(resolution) + 1
+    grid_size = [n, n, n]
+    num_points = n * n * n
+    batch_size = min(state.query_batch_size, num_points)
+    num_batches = -(-num_points // batch_size)
+
+    grid_tiles = torch.zeros(num_batches * batch_size, 3, dtype=torch.float32, device=device)
+    grid_tiles[:num_points] = make_grid_on_device(_BBOX_MIN, _BBOX_MAX, resolution, device)
+    grid_tiles = grid_tiles.view(num_batches, batch_size, 3)
+
+    cached = (grid_tiles, num_points, grid_size)
+    state.grid_cache[key] = cached
+    logger.info(f"Cached {grid_size[0]}^3 query grid on {device}")
+    return cached
 
-        # resolution_base is log2 of resolution: 32->5, 64->6, 128->7
-        resolution_base = np.log2(resolution)
 
-        grid_points_np, grid_size, _ = generate_dense_grid_points(
-            bbox_min,
-            bbox_max,
-            resolution_base,
-            indexing='ij'
+class QueryGraph:
+    """
+    CUDA graph of one occupancy decoder call at a fixed batch size.
+
+    Points and latents are copied into static buffers and the captured
+    kernels are replayed, removing per-kernel launch overhead from the query
+    loop. Grid tiles all share one shape, so a single static input buffer
+    serves every batch. Callers must hold `lock` while using the buffers.
+    """
+
+    def __init__(self, batch_size: int, latents: torch.Tensor, use_autocast: bool):
+        device = latents.device
+        self.lock = threading.Lock()
+        self.points = torch.zeros(1, batch_size, 3, device=device)
+        self.latents = latents.clone()
+
+        # Autocast's weight cache must be off while capturing
+        autocast = torch.autocast(
+            device_type="cuda", dtype=latents.dtype, enabled=use_autocast, cache_enabled=False
         )
-        grid_points = torch.from_numpy(grid_points_np).to(device)
 
-        logger.info(f"Querying occupancy at {grid_points.shape[0]} points...")
+        # Warm up on a side stream so lazy initialization happens before capture
+        warmup_stream = torch.cuda.Stream(device)
+        warmup_stream.wait_stream(torch.cuda.current_stream(device))
+        with torch.cuda.stream(warmup_stream), autocast:
+            for _ in range(2):
+                state.shape_model.query(self.points, self.latents)
+        torch.cuda.current_stream(device).wait_stream(warmup_stream)
+
+        # Capture runs on a GPU executor thread while pooled engines may be
+        # running GPT on others; only this thread's calls must be capture-safe
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self.graph, capture_error_mode="thread_local"), autocast:
+            self.output = state.shape_model.query(self.points, self.latents).squeeze(0)
+
+    def run(self, tile: torch.Tensor) -> torch.Tensor:
+        """Query one grid tile [1, batch_size, 3]; returns a view of its logits"""
+        self.points.copy_(tile)
+        self.graph.replay()
+        return self.output
+
+
+def get_query_graph(
+    batch_size: int,
+    latents: torch.Tensor,
+    use_autocast: bool,
+) -> Optional[QueryGraph]:
+    """
+    Return the cached QueryGraph for this batch shape, capturing it on first use.
 
-        # Query occupancy decoder in batches to manage memory
-        batch_size = 100000
-        num_points = grid_points.shape[0]
-        all_logits = []
+    Returns None (eager queries) off CUDA, when disabled via
+    ROBOCUBE_CUDA_GRAPHS=0, or after a failed capture.
+    """
+    if not state.use_cuda_graphs or latents.device.type != "cuda":
+        return None
 
-        for i in range(0, num_points, batch_size):
-            batch = grid_points[i:i + batch_size].unsqueeze(0)  # [1, batch, 3]
-            logits = state.shape_model.query(batch, latents)  # [1, batch]
-            all_logits.append(logits.squeeze(0).cpu())
+    key = (batch_size, tuple(latents.shape), latents.dtype)
+    with state.query_graphs_lock:
+        graph = state.query_graphs.get(key)
+        if graph is None:
+            try:
+                graph = QueryGraph(batch_size, latents, use_autocast)
+            except Exception as e:
+                logger.warning(f"CUDA graph capture failed ({e}), using eager occupancy queries")
+                state.use_cuda_graphs = False
+                return None
+            state.query_graphs[key] = graph
+            logger.info(f"Captured occupancy query CUDA graph for batch size {batch_size}")
+    return graph
 
-        logits_tensor = torch.cat(all_logits, dim=0)
-        logits_np = logits_tensor.numpy()
 
-        logger.info(f"Occupancy range: [{logits_np.min():.3f}, {logits_np.max():.3f}]")
+def prepare_query_latents(latents: torch.Tensor):
+    """
+    Pick the decoder query precision for the current device.
 
-        # Step 4: Threshold to get occupied voxels
-        occupied_mask = logits_np > threshold
-        occupied_indices = np.where(occupied_mask)[0]
+    Returns (query_latents, query_dtype, use_autocast); the latents are cast
+    once here rather than inside every batch.
+    """
+    query_dtype = state.query_dtype if state.device.type == "cuda" else torch.float32
+    use_autocast = query_dtype != torch.float32
+    query_latents = latents.to(query_dtype) if use_autocast else latents
+    return query_latents, query_dtype, use_autocast
 
-        # Convert flat indices to 3D coordinates
-        # Grid is stored in row-major order with 'ij' indexing
-        # grid_size is [nx, ny, nz] where n = 2^resolution_base + 1
-        nx, ny, nz = grid_size
-        occupied_voxels = []
-        for idx in occupied_indices:
-            # 'ij' indexing: y varies fastest, then z, then x
-            y = idx % ny
-            z = (idx // ny) % nz
-            x = idx // (ny * nz)
-            occupied_voxels.append([int(x), int(y), int(z)])
-
-        logger.info(f"Found {len(occupied_voxels)} occupied voxels ({100*len(occupied_voxels)/num_points:.1f}%)")
-
-        # Step 5: Generate colors if requested
-        voxel_colors = None
-        if color_mode and occupied_voxels:
-            voxel_colors = generate_voxel_colors(
-                occupied_voxels,
-                logits_np,
-                occupied_indices,
-                nx, ny, nz,
-                color_mode,
-                base_color or (0.8, 0.8, 0.8),  # Default light gray
-            )
-            logger.info(f"Generated colors using mode: {color_mode}")
 
-    generation_time = time.time() - start_time
+def unravel_voxels(flat_indices: np.ndarray, grid_size) -> np.ndarray:
+    """
+    Convert flat grid indices to an int32 [N, 3] array of (x, y, z) voxels.
+
+    Grid is stored in row-major order with 'ij' indexing (see
+    make_grid_on_device) and grid_size is [nx, ny, nz] where
+    n = resolution + 1, so flat = (x * ny + y) * nz + z with z varying
+    fastest. Indices fit in int32 for every supported resolution, so the
+    divmods run on int32 columns and the result needs no final cast.
+    """
+    nx, ny, nz = grid_size
+    flat = np.asarray(flat_indices).astype(np.int32, copy=False)
+    voxels = np.empty((len(flat), 3), dtype=np.int32)
+    voxels[:, 0], yz = np.divmod(flat, ny * nz)
+    voxels[:, 1], voxels[:, 2] = np.divmod(yz, nz)
+    return voxels
+
+
+class PendingOccupancy:
+    """Occupancy query enqueued on the GPU, waiting for CPU post-processing"""
+    def __init__(self, logits, logit_range, host_logits, copy_event, grid_size, event):
+        self.logits = logits
+        self.logit_range = logit_range
+        self.host_logits = host_logits
+        self.copy_event = copy_event
+        self.grid_size = grid_size
+        self.event = event
+
+    @property
+    def ready(self) -> bool:
+        """Whether the GPU work and host copies have finished (always True off CUDA)"""
+        return (
+            (self.event is None or self.event.query())
+            and (self.copy_event is None or self.copy_event.query())
+        )
+
+
+_latent_memo = threading.local()
+
+
+def install_latent_memo(module: torch.nn.Module):
+    """
+    Let the leaf modules of `module` reuse outputs that depend only on the latents.
+
+    Inside a latent_memo() block, a leaf module called with the latents
+    tensor (or with an output previously memoized from it) computes once and
+    returns the cached result on later calls. Projections of the latents
+    (e.g. cross-attention keys and values) then run once per request
+    instead of once per query batch. Outside the block, or for inputs
+    derived from the query points, modules run as usual.
+
+    Returns (module, original forward) pairs, so the patch can be undone
+    (see check_latent_memo).
+    """
+    patched = []
+    for sub in module.modules():
+        if next(sub.children(), None) is not None:
+            continue
+
+        def forward(*args, _sub=sub, _original=sub.forward, **kwargs):
+            memo = getattr(_latent_memo, "memo", None)
+            if memo is None or kwargs or len(args) != 1 or id(args[0]) not in memo["derived"]:
+                return _original(*args, **kwargs)
+            key = (id(_sub), id(args[0]))
+            out = memo["outputs"].get(key)
+            if out is None:
+                out = _original(args[0])
+                memo["outputs"][key] = out
+                if isinstance(out, torch.Tensor):
+                    memo["derived"][id(out)] = out
+            return out
+
+        patched.append((sub, sub.forward))
+        sub.forward = forward
+    return patched
+
+
+@contextlib.contextmanager
+def latent_memo(latents: torch.Tensor):
+    """Memoize latent-only module outputs for this thread (see install_latent_memo)"""
+    _latent_memo.memo = {"derived": {id(latents): latents}, "outputs": {}}
+    try:
+        yield
+    finally:
+        _latent_memo.memo = None
+
+
+def check_latent_memo(device: torch.device) -> bool:
+    """
+    Compare memoized and plain occupancy queries on two probe tiles.
+
+    The memo keys on tensor identity, so a decoder that feeds the latents
+    through a module together with point-dependent state would silently get
+    stale outputs. Two tiles of a 16^3 grid are queried with dummy latents,
+    plainly and then inside one latent_memo() block (the second tile reuses
+    the first one's memoized projections); returns whether the logits match.
+    """
+    with torch.inference_mode():
+        latents, query_dtype, use_autocast = prepare_query_latents(make_dummy_latents(device))
+        points = make_grid_on_device(_BBOX_MIN, _BBOX_MAX, 16, device)
+        tiles = [points[:2048].unsqueeze(0), points[2048:4096].unsqueeze(0)]
+        with torch.autocast(device_type=device.type, dtype=query_dtype, enabled=use_autocast):
+            plain = [state.shape_model.query(tile, latents) for tile in tiles]
+            with latent_memo(latents):
+                memoized = [state.shape_model.query(tile, latents) for tile in tiles]
+    return all(
+        torch.allclose(a.float(), b.float(), rtol=1e-3, atol=1e-3) for a, b in zip(plain, memoized)
+    )
+
+
+def query_points(points: torch.Tensor, query_latents: torch.Tensor, batch_size: int) -> torch.Tensor:
+    """
+    Eagerly query an arbitrary [N, 3] point set in batches; returns fp32 logits [N].
+
+    The last batch is zero-padded to batch_size like the dense grid tiles, so
+    a compiled decoder sees one shape whatever N is; its extra logits are
+    dropped.
+    """
+    num_points = points.shape[0]
+    logits = torch.empty(num_points, dtype=torch.float32, device=points.device)
+    for i in range(0, num_points, batch_size):
+        tile = points[i:i + batch_size]
+        count = tile.shape[0]
+        if count < batch_size:
+            padded = points.new_zeros(batch_size, 3)
+            padded[:count] = tile
+            tile = padded
+        logits[i:i + count] = state.shape_model.query(tile.unsqueeze(0), query_latents).squeeze(0)[:count]
+    return logits
+
+
+def hierarchical_candidates(
+    grid_points: torch.Tensor,
+    resolution: int,
+    query_latents: torch.Tensor,
+    threshold: float,
+    batch_size: int,
+) -> torch.Tensor:
+    """
+    Find the fine grid points worth querying from a 4x coarser pass.
+
+    The coarse grid is every 4th fine point along each axis (same
+    coordinates). Its occupancy is dilated by one coarse cell and mapped
+    back to the fine grid, so only points near the surface get queried.
+    Returns flat indices into `grid_points`.
+    """
+    n = resolution + 1
+    grid = grid_points.view(n, n, n, 3)
+    coarse = grid[::4, ::4, ::4]
+    nc = coarse.shape[0]
+
+    coarse_occupied = query_points(coarse.reshape(-1, 3), query_latents, batch_size) > threshold
+    dilated = torch.nn.functional.max_pool3d(
+        coarse_occupied.view(1, 1, nc, nc, nc).float(), kernel_size=3, stride=1, padding=1
+    )[0, 0] > 0
+
+    parent = torch.arange(n, device=grid_points.device) // 4
+    fine_mask = dilated[parent[:, None, None], parent[None, :, None], parent[None, None, :]]
+    return torch.nonzero(fine_mask.reshape(-1)).squeeze(1)
+
+
+def launch_occupancy_query(
+    latents: torch.Tensor,
+    resolution: int,
+    include_logits: bool = False,
+    threshold: float = 0.0,
+    hierarchical: bool = False,
+) -> PendingOccupancy:
+    """
+    Enqueue the occupancy decoder over the dense grid without waiting for it.
+
+    On CUDA all work goes to `state.query_stream` and an event is recorded
+    after the last kernel, so callers can wait for it without blocking a
+    thread. Off CUDA the work runs synchronously.
+
+    With `hierarchical`, a coarse pass picks the fine points to query (see
+    hierarchical_candidates) and every other point gets a -inf logit. This
+    syncs once on the candidate count, so it does not stay asynchronous.
+    """
+    device = state.device
+    query_stream = state.query_stream
+    stream_context = torch.cuda.stream(query_stream) if query_stream is not None else contextlib.nullcontext()
+
+    with torch.inference_mode(), stream_context:
+        if query_stream is not None:
+            # Latents come from the GPT thread's stream
+            query_stream.wait_stream(torch.cuda.default_stream(device))
+            latents.record_stream(query_stream)
+
+        # Step 3: Fetch the (cached) grid points and query occupancy decoder
+        grid_tiles, num_points, grid_size = get_dense_grid(resolution, device)
+        num_batches, batch_size, _ = grid_tiles.shape
+
+        logger.info(f"Querying occupancy at {num_points} points...")
+
+        # Query occupancy decoder one pre-built tile at a time to manage memory.
+        # Logits stay on the device; only what the response needs is copied back
+        padded_logits = torch.empty(num_batches * batch_size, dtype=torch.float32, device=device)
+
+        # Raw logits requested: drain each batch into a pinned host buffer on
+        # the copy stream so the copy overlaps with the next batch's query
+        host_logits = None
+        copy_stream = None
+        if include_logits and device.type == "cuda":
+            host_logits = torch.empty(num_points, dtype=torch.float32, pin_memory=True)
+            copy_stream = state.copy_stream
+            padded_logits.record_stream(copy_stream)
+
+        # Run the decoder in reduced precision on CUDA; logits are written back
+        # into the fp32 buffer, so thresholding is unaffected
+        query_latents, query_dtype, use_autocast = prepare_query_latents(latents)
+
+        # Replay a captured CUDA graph per batch when available (one graph per
+        # batch shape); its lock keeps concurrent requests off the static buffers.
+        # The lock is only needed while enqueueing: later users of the graph
+        # are ordered behind this work on the query stream.
+        graph = None if hierarchical else get_query_graph(batch_size, query_latents, use_autocast)
+        # Eager queries memoize latent-only projections instead
+        query_context = graph.lock if graph is not None else latent_memo(query_latents)
+
+        with query_context, torch.autocast(device_type=device.type, dtype=query_dtype, enabled=use_autocast):
+            if hierarchical:
+                grid_points = grid_tiles.view(-1, 3)[:num_points]
+                candidates = hierarchical_candidates(
+                    grid_points, resolution, query_latents, threshold, batch_size
+                )
+                logger.info(f"Hierarchical pass: querying {len(candidates)}/{num_points} points")
+                padded_logits.fill_(float("-inf"))
+                padded_logits[candidates] = query_points(grid_points[candidates], query_latents, batch_size)
+                if copy_stream is not None:
+                    copy_stream.wait_stream(torch.cuda.current_stream(device))
+                    with torch.cuda.stream(copy_stream):
+                        host_logits.copy_(padded_logits[:num_points], non_blocking=True)
+            else:
+                if graph is not None:
+                    graph.latents.copy_(query_latents)
+                for k in range(num_batches):
+                    i = k * batch_size
+                    if graph is not None:
+                        padded_logits[i:i + batch_size] = graph.run(grid_tiles[k:k + 1])
+                    else:
+                        padded_logits[i:i + batch_size] = state.shape_model.query(
+                            grid_tiles[k:k + 1], query_latents
+                        ).squeeze(0)
+                    if copy_stream is not None:
+                        j = min(i + batch_size, num_points)
+                        copy_stream.wait_stream(torch.cuda.current_stream(device))
+                        with torch.cuda.stream(copy_stream):
+                            host_logits[i:j].copy_(padded_logits[i:j], non_blocking=True)
+
+        # Drop the padding of the last tile
+        logits = padded_logits[:num_points]
+        logit_range = torch.stack(torch.aminmax(logits))
+
+        event = None
+        if query_stream is not None:
+            event = torch.cuda.Event()
+            event.record(query_stream)
+
+        # The copy stream is shared, so wait on this request's copies only
+        copy_event = None
+        if copy_stream is not None:
+            copy_event = torch.cuda.Event()
+            copy_event.record(copy_stream)
+
+    return PendingOccupancy(logits, logit_range, host_logits, copy_event, grid_size, event)
+
+
+def finish_occupancy_query(
+    pending: PendingOccupancy,
+    threshold: float = 0.0,
+    include_logits: bool = False,
+    color_mode: Optional[str] = None,
+    base_color: Optional[Tuple[float, float, float]] = None,
+    seed: Optional[int] = None,
+    start_time: Optional[float] = None,
+) -> OccupancyResult:
+    """
+    Threshold a launched occupancy query and build the result.
+
+    Blocks until the GPU work is done if it is still running.
+    """
+    stream_context = (
+        torch.cuda.stream(state.query_stream) if state.query_stream is not None else contextlib.nullcontext()
+    )
+
+    with torch.inference_mode(), stream_context:
+        logits = pending.logits
+        num_points = logits.shape[0]
+
+        logit_min, logit_max = pending.logit_range.tolist()
+        logger.info(f"Occupancy range: [{logit_min:.3f}, {logit_max:.3f}]")
+
+        # Step 4: Threshold on the device and transfer only the occupied indices.
+        # The max is already on the host, so an empty field skips the mask and
+        # nonzero pass entirely
+        if logit_max <= threshold:
+            occupied_indices = np.empty(0, dtype=np.int64)
+            occupied_logits = None
+        else:
+            occupied = torch.nonzero(logits > threshold).squeeze(1)
+            occupied_indices = occupied.cpu().numpy()
+            occupied_logits = logits[occupied].cpu().numpy() if color_mode == 'density' else None
+        logits_np = None
+        if pending.copy_event is not None:
+            pending.copy_event.synchronize()
+            logits_np = pending.host_logits.numpy()
+        elif include_logits:
+            logits_np = logits.cpu().numpy()
+
+    # Convert flat indices to 3D coordinates
+    grid_size = pending.grid_size
+    nx, ny, nz = grid_size
+    occupied_voxels = unravel_voxels(occupied_indices, grid_size)
+
+    logger.info(f"Found {len(occupied_voxels)} occupied voxels ({100*len(occupied_voxels)/num_points:.1f}%)")
+
+    # Step 5: Generate colors if requested
+    voxel_colors = None
+    if color_mode and len(occupied_voxels):
+        voxel_colors = generate_voxel_colors(
+            occupied_voxels,
+            occupied_logits,
+            nx, ny, nz,
+            color_mode,
+            base_color or (0.8, 0.8, 0.8),  # Default light gray
+        )
+        logger.info(f"Generated colors using mode: {color_mode}")
+
+    generation_time = time.time() - start_time if start_time is not None else None
 
     # Return actual grid resolution (number of cells, not points)
     actual_resolution = grid_size[0] - 1  # grid_size is points, not cells
 
-    return OccupancyResult(
+    # Built without validation: voxels, colors and logits stay NumPy arrays until an
+    # endpoint serializes them (see occupancy_json_payload / occupancy_binary_payload)
+    return OccupancyResult.model_construct(
         resolution=actual_resolution,
-        bbox_min=bbox_min.tolist(),
-        bbox_max=bbox_max.tolist(),
+        bbox_min=_BBOX_MIN_LIST,
+        bbox_max=_BBOX_MAX_LIST,
         occupied_voxels=occupied_voxels,
         voxel_colors=voxel_colors,
-        logits=logits_np.tolist() if include_logits else None,
+        logits=logits_np,
         metadata=GenerationMetadata(
             generation_time_secs=generation_time,
             seed_used=seed,
@@ -457,6 +1325,472 @@ def generate_occupancy_field(
     )
 
 
+def query_occupancy(
+    latents: torch.Tensor,
+    resolution: int,
+    threshold: float = 0.0,
+    include_logits: bool = False,
+    color_mode: Optional[str] = None,
+    base_color: Optional[Tuple[float, float, float]] = None,
+    seed: Optional[int] = None,
+    start_time: Optional[float] = None,
+    hierarchical: bool = False,
+) -> OccupancyResult:
+    """
+    Query the occupancy decoder on a dense grid for a single latent.
+
+    `latents` must have a batch dimension of 1. `start_time` lets callers that
+    ran GPT separately report the end-to-end generation time. Blocking
+    wrapper around launch_occupancy_query / finish_occupancy_query.
+    """
+    if start_time is None:
+        start_time = time.time()
+
+    pending = launch_occupancy_query(
+        latents,
+        resolution,
+        include_logits=include_logits,
+        threshold=threshold,
+        hierarchical=hierarchical,
+    )
+    return finish_occupancy_query(
+        pending,
+        threshold=threshold,
+        include_logits=include_logits,
+        color_mode=color_mode,
+        base_color=base_color,
+        seed=seed,
+        start_time=start_time,
+    )
+
+
+def release_cached_memory():
+    """
+    Return cached CUDA blocks to the driver when fragmentation builds up.
+
+    empty_cache() synchronizes and makes the next request re-allocate, so
+    it only runs once reserved-but-unallocated memory exceeds
+    ROBOCUBE_EMPTY_CACHE_MB (default 1024).
+    """
+    if state.device is None or state.device.type != "cuda":
+        return
+    slack = torch.cuda.memory_reserved(state.device) - torch.cuda.memory_allocated(state.device)
+    if slack > int(os.getenv("ROBOCUBE_EMPTY_CACHE_MB", "1024")) * 1024 * 1024:
+        torch.cuda.empty_cache()
+        logger.info(f"Released {slack / 2**20:.0f} MB of cached CUDA memory")
+
+
+async def run_on_gpu(func, *args, **kwargs):
+    """Run blocking GPU work on the dedicated GPU executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(state.gpu_executor, functools.partial(func, *args, **kwargs))
+
+
+async def wait_for_occupancy(pending: PendingOccupancy):
+    """Yield to the event loop until a launched query's GPU work is done"""
+    while not pending.ready:
+        await asyncio.sleep(0.001)
+
+
+def iter_occupied_voxel_chunks(
+    latents: torch.Tensor,
+    resolution: int,
+    threshold: float = 0.0,
+):
+    """
+    Yield occupied voxels one decoder batch at a time.
+
+    Each item is an int32 [n, 3] array in the same convention as
+    query_occupancy. GPU work happens lazily as the generator is advanced,
+    so callers may step it from different threads; no torch context spans
+    a yield. On CUDA the decoder runs on the query stream and thresholding
+    plus readback on the copy stream, double-buffered across tiles.
+    """
+    device = state.device
+
+    with torch.inference_mode():
+        grid_tiles, num_points, grid_size = get_dense_grid(resolution, device)
+        query_latents, query_dtype, use_autocast = prepare_query_latents(latents)
+    num_batches, batch_size, _ = grid_tiles.shape
+
+    query_stream = state.query_stream
+    copy_stream = state.copy_stream
+
+    def on_stream(stream):
+        return torch.cuda.stream(stream) if stream is not None else contextlib.nullcontext()
+
+    def launch(k):
+        """Enqueue tile k on the query stream; returns (logits, done event)"""
+        i = k * batch_size
+        with torch.inference_mode(), on_stream(query_stream), torch.autocast(
+            device_type=device.type, dtype=query_dtype, enabled=use_autocast
+        ):
+            if k == 0 and query_stream is not None:
+                query_stream.wait_stream(torch.cuda.default_stream(device))
+            tile = grid_tiles[k:k + 1]
+            graph = get_query_graph(batch_size, query_latents, use_autocast)
+            if graph is not None:
+                # Copied out of the static output before the next replay
+                with graph.lock:
+                    graph.latents.copy_(query_latents)
+                    logits = graph.run(tile).clone()
+            else:
+                logits = state.shape_model.query(tile, query_latents).squeeze(0)
+            logits = logits[:num_points - i]
+
+            done = None
+            if query_stream is not None:
+                done = torch.cuda.Event()
+                done.record(query_stream)
+                logits.record_stream(copy_stream)
+        return logits, done
+
+    def collect(k, logits, done):
+        """Threshold a launched tile on the copy stream and read back its voxels"""
+        with torch.inference_mode(), on_stream(copy_stream):
+            if done is not None:
+                copy_stream.wait_event(done)
+            occupied = torch.nonzero(logits > threshold).squeeze(1).cpu()
+        return unravel_voxels(occupied.numpy() + k * batch_size, grid_size)
+
+    # Keep one tile in flight: tile k + 1 is queued before tile k is read
+    # back, so the readback sync only waits on the copy stream
+    pending = launch(0)
+    for k in range(1, num_batches):
+        next_pending = launch(k)
+        yield collect(k - 1, *pending)
+        pending = next_pending
+    yield collect(num_batches - 1, *pending)
+
+
+def generate_occupancy_field(
+    prompt: str,
+    resolution: int,
+    seed: Optional[int] = None,
+    guidance_scale: float = 3.0,
+    top_p: Optional[float] = None,
+    bounding_box_xyz: Optional[Tuple[float, float, float]] = None,
+    threshold: float = 0.0,
+    include_logits: bool = False,
+    color_mode: Optional[str] = None,
+    base_color: Optional[Tuple[float, float, float]] = None,
+) -> OccupancyResult:
+    """
+    Generate occupancy field from text prompt.
+
+    Directly queries the shape model's occupancy decoder at discrete grid points
+    instead of extracting a mesh.
+    """
+    start_time = time.time()
+
+    latents = generate_latents(
+        [prompt],
+        seed=seed,
+        guidance_scale=guidance_scale,
+        top_p=top_p,
+        bounding_box_xyz=bounding_box_xyz,
+    )
+    return query_occupancy(
+        latents,
+        resolution,
+        threshold=threshold,
+        include_logits=include_logits,
+        color_mode=color_mode,
+        base_color=base_color,
+        seed=seed,
+        start_time=start_time,
+    )
+
+
+def occupancy_cache_key(request: OccupancyRequest) -> Optional[tuple]:
+    """
+    Key for `state.result_cache`, or None if the request should not be cached.
+
+    Only deterministic requests (seeded, or greedy with top_p=None) are
+    cached, and never with include_logits since full logit grids are large.
+    """
+    if state.cache_size <= 0 or request.include_logits:
+        return None
+    if request.seed is None and request.top_p is not None:
+        return None
+    return (
+        request.prompt,
+        request.seed,
+        request.guidance_scale,
+        request.top_p,
+        tuple(request.bounding_box_xyz) if request.bounding_box_xyz else None,
+        request.grid_resolution,
+        request.threshold,
+        request.color_mode,
+        tuple(request.base_color) if request.base_color else None,
+        request.hierarchical,
+    )
+
+
+class OccupancyBatcher:
+    """
+    Coalesces concurrent /generate_occupancy requests into batched GPT runs.
+
+    Requests wait at most `max_delay` seconds (or until `max_batch` are
+    pending). Requests sharing the same sampling parameters go through a
+    single `run_gpt` call; the latents are then split back and each request
+    gets its own occupancy query. Seeded requests always run alone so their
+    output does not depend on what else was in flight. Up to `concurrency`
+    groups (the engine pool size) generate at once.
+    """
+
+    def __init__(self, max_batch: int = 8, max_delay: float = 0.02, concurrency: int = 1):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # One GPT run in flight per pooled engine
+        self.gpt_slots = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+
+    async def submit(self, request: OccupancyRequest) -> OccupancyResult:
+        """Queue a request and wait for its result (or reuse a cached one)"""
+        key = occupancy_cache_key(request)
+        if key is not None:
+            cached = cache_get(state.result_cache, key)
+            if cached is not None:
+                logger.info("Serving cached occupancy result")
+                return cached.model_copy(update={"metadata": GenerationMetadata(
+                    generation_time_secs=0.0,
+                    seed_used=request.seed,
+                    model_version=state.model_version,
+                )})
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, time.time(), future))
+        result = await future
+        if key is not None:
+            cache_put(state.result_cache, key, result)
+        return result
+
+    async def run(self):
+        """Worker loop: collect pending requests and dispatch them in groups"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for item in pending:
+                request = item[0]
+                key = (
+                    request.guidance_scale,
+                    request.top_p,
+                    tuple(request.bounding_box_xyz) if request.bounding_box_xyz else None,
+                    # Seeded requests are never coalesced
+                    (request.seed, id(item)) if request.seed is not None else None,
+                )
+                groups.setdefault(key, []).append(item)
+
+            # Groups run concurrently, bounded by the engine pool
+            for group in groups.values():
+                task = asyncio.create_task(self._run_group(group))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+    async def _run_group(self, group):
+        """Run GPT once for a group, then query occupancy per request"""
+        first = group[0][0]
+        try:
+            async with self.gpt_slots:
+                latents = await run_on_gpu(
+                    generate_latents,
+                    [request.prompt for request, _, _ in group],
+                    seed=first.seed,
+                    guidance_scale=first.guidance_scale,
+                    top_p=first.top_p,
+                    bounding_box_xyz=tuple(first.bounding_box_xyz) if first.bounding_box_xyz else None,
+                )
+        except Exception as e:
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if len(group) > 1:
+            logger.info(f"Batched {len(group)} prompts into one GPT run")
+
+        for i, (request, submitted_at, future) in enumerate(group):
+            if future.done():
+                continue
+            finish_kwargs = dict(
+                threshold=request.threshold,
+                include_logits=request.include_logits,
+                color_mode=request.color_mode,
+                base_color=tuple(request.base_color) if request.base_color else None,
+                seed=request.seed,
+                start_time=submitted_at,
+            )
+            try:
+                if state.query_stream is not None and not request.hierarchical:
+                    # Enqueue the decoder on the query stream from a GPU thread
+                    # (grid build, graph capture and the eager fallback block),
+                    # then poll its event so no thread sits blocked while the GPU works
+                    pending = await run_on_gpu(
+                        launch_occupancy_query,
+                        latents[i:i + 1],
+                        request.grid_resolution,
+                        include_logits=request.include_logits,
+                    )
+                    await wait_for_occupancy(pending)
+                    result = await run_on_gpu(finish_occupancy_query, pending, **finish_kwargs)
+                else:
+                    result = await run_on_gpu(
+                        query_occupancy,
+                        latents[i:i + 1],
+                        request.grid_resolution,
+                        hierarchical=request.hierarchical,
+                        **finish_kwargs,
+                    )
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+        # Drop this group's device tensors, then trim the allocator off the
+        # response path
+        del latents
+        state.gpu_executor.submit(release_cached_memory)
+
+
+# =============================================================================
+# Response Serialization
+# =============================================================================
+
+def resolve_occupancy_format(result: OccupancyResult, occupancy_format: str) -> str:
+    """
+    Pick the occupancy encoding for a response.
+
+    'auto' sends the bitmask once the voxel list (~24 bytes per voxel as JSON
+    or a wide int array) would be larger than one bit per grid point.
+    """
+    if occupancy_format != "auto":
+        return occupancy_format
+    n = result.resolution + 1
+    bitmask_bytes = (n * n * n + 7) // 8
+    return "bitmask" if len(result.occupied_voxels) * 24 > bitmask_bytes else "voxels"
+
+
+def occupancy_bitmask(result: OccupancyResult) -> bytes:
+    """
+    Pack occupied voxels into one bit per grid point.
+
+    Bits follow the flat grid layout used for logits ((x, y, z) with z
+    fastest), LSB first, so set bits appear in the same order as
+    occupied_voxels and voxel_colors stay aligned.
+    """
+    n = result.resolution + 1
+    voxels = np.asarray(result.occupied_voxels)
+    mask = np.zeros(n * n * n, dtype=bool)
+    if len(voxels):
+        mask[np.ravel_multi_index((voxels[:, 0], voxels[:, 1], voxels[:, 2]), (n, n, n))] = True
+    return np.packbits(mask, bitorder='little').tobytes()
+
+
+def occupancy_json_payload(
+    result: OccupancyResult,
+    occupancy_format: str = "voxels",
+    legacy_logits: bool = False,
+) -> dict:
+    """
+    Convert an OccupancyResult into data for ORJSONResponse.
+
+    NumPy arrays are passed through untouched; orjson serializes them natively
+    (OPT_SERIALIZE_NUMPY) without building Python lists first. Logits are sent
+    as base64 float16 bytes in logits_b64, or as the legacy float list in
+    `logits` when `legacy_logits` is set.
+    """
+    occupancy_format = resolve_occupancy_format(result, occupancy_format)
+    occupied_voxels = result.occupied_voxels
+    bitmask = voxels_b64 = voxels_dtype = voxels_shape = None
+    if occupancy_format == "bitmask":
+        bitmask = base64.b64encode(occupancy_bitmask(result)).decode("ascii")
+        occupied_voxels = []
+    elif occupancy_format == "packed":
+        # Coordinates go up to resolution (grid points, not cells)
+        voxels_dtype = "uint8" if result.resolution < 256 else "uint16"
+        packed = np.ascontiguousarray(result.occupied_voxels, dtype=np.dtype(voxels_dtype).newbyteorder('<'))
+        voxels_b64 = base64.b64encode(packed.tobytes()).decode("ascii")
+        voxels_shape = [len(packed), 3]
+        occupied_voxels = []
+
+    logits = logits_b64 = logits_dtype = logits_shape = None
+    if result.logits is not None:
+        if legacy_logits:
+            logits = result.logits
+        else:
+            n = result.resolution + 1
+            logits_b64 = base64.b64encode(result.logits.astype('<f2').tobytes()).decode("ascii")
+            logits_dtype = "float16"
+            logits_shape = [n, n, n]
+
+    return {
+        "resolution": result.resolution,
+        "bbox_min": result.bbox_min,
+        "bbox_max": result.bbox_max,
+        "occupied_voxels": occupied_voxels,
+        "voxel_colors": result.voxel_colors,
+        "logits": logits,
+        "logits_b64": logits_b64,
+        "logits_dtype": logits_dtype,
+        "logits_shape": logits_shape,
+        "occupancy_format": occupancy_format,
+        "voxels_b64": voxels_b64,
+        "voxels_dtype": voxels_dtype,
+        "voxels_shape": voxels_shape,
+        "occupancy_bitmask": bitmask,
+        "metadata": result.metadata.model_dump() if result.metadata is not None else None,
+    }
+
+
+def occupancy_binary_payload(result: OccupancyResult, occupancy_format: str = "voxels") -> Tuple[bytes, dict]:
+    """
+    Pack an OccupancyResult into a binary body and describing headers.
+
+    Body layout (little-endian, concatenated):
+    - occupancy: int16 [N, 3] as (x, y, z), or packed bits [ceil(nx * ny * nz / 8)]
+      when X-Occupancy-Format is 'bitmask' (see occupancy_bitmask)
+    - voxel colors: float32 [N, 3], only if X-Has-Colors is 1
+    - logits: float16 [nx * ny * nz], only if X-Dtype is present
+    """
+    occupancy_format = resolve_occupancy_format(result, occupancy_format)
+    if occupancy_format == "bitmask":
+        parts = [occupancy_bitmask(result)]
+    else:
+        # The binary voxel layout is already packed integers
+        occupancy_format = "voxels"
+        parts = [np.ascontiguousarray(result.occupied_voxels, dtype='<i2').tobytes()]
+    headers = {
+        "X-Resolution": str(result.resolution),
+        "X-Voxel-Count": str(len(result.occupied_voxels)),
+        "X-Occupancy-Format": occupancy_format,
+        "X-Has-Colors": "1" if result.voxel_colors is not None else "0",
+    }
+    if result.voxel_colors is not None:
+        parts.append(np.asarray(result.voxel_colors, dtype='<f4').tobytes())
+    if result.logits is not None:
+        n = result.resolution + 1
+        parts.append(result.logits.astype('<f2').tobytes())
+        headers["X-Shape"] = f"{n},{n},{n}"
+        headers["X-Dtype"] = "float16"
+    if result.metadata is not None and result.metadata.generation_time_secs is not None:
+        headers["X-Generation-Time"] = f"{result.metadata.generation_time_secs:.3f}"
+    return b"".join(parts), headers
+
+
 # =============================================================================
 # API Endpoints
 # =============================================================================
@@ -465,6 +1799,12 @@ def generate_occupancy_field(
 async def startup_event():
     """Initialize server on startup"""
     logger.info("Cube3D Occupancy Server starting...")
+    state.batcher = OccupancyBatcher(
+        max_batch=int(os.getenv("ROBOCUBE_MAX_BATCH", "8")),
+        max_delay=float(os.getenv("ROBOCUBE_BATCH_WAIT_MS", "20")) / 1000.0,
+        concurrency=state.engine_pool_size,
+    )
+    asyncio.create_task(state.batcher.run())
     asyncio.create_task(load_models())
 
 
@@ -487,15 +1827,8 @@ async def health():
     )
 
 
-@app.post("/generate_occupancy", response_model=OccupancyResult)
-async def generate_occupancy(request: OccupancyRequest):
-    """
-    Generate occupancy field from text prompt.
-
-    Directly queries the shape model's occupancy decoder at discrete grid points,
-    returning binary voxel occupancy instead of a mesh. This is more suitable for
-    voxel-based applications.
-    """
+def check_occupancy_request(request: OccupancyRequest):
+    """Reject occupancy requests that cannot be served right now"""
     if not state.models_loaded:
         if state.loading:
             raise HTTPException(status_code=503, detail="Models still loading - try again shortly")
@@ -506,29 +1839,139 @@ async def generate_occupancy(request: OccupancyRequest):
     if not (request.grid_resolution & (request.grid_resolution - 1) == 0):
         raise HTTPException(status_code=400, detail="grid_resolution must be a power of 2")
 
+    if request.occupancy_format not in OCCUPANCY_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"occupancy_format must be one of {', '.join(OCCUPANCY_FORMATS)}",
+        )
+
+
+@app.post("/generate_occupancy", response_model=OccupancyResult)
+async def generate_occupancy(request: OccupancyRequest, legacy_logits: bool = False):
+    """
+    Generate occupancy field from text prompt.
+
+    Directly queries the shape model's occupancy decoder at discrete grid points,
+    returning binary voxel occupancy instead of a mesh. This is more suitable for
+    voxel-based applications.
+
+    With include_logits, logits come back as base64 float16 in logits_b64;
+    pass ?legacy_logits=true for the old `logits` float list.
+    """
+    check_occupancy_request(request)
+
     try:
-        bbox = tuple(request.bounding_box_xyz) if request.bounding_box_xyz else None
-        base_color = tuple(request.base_color) if request.base_color else None
+        # Concurrent requests are coalesced into batched GPT runs
+        result = await state.batcher.submit(request)
+        # Returned directly so FastAPI skips re-validating the voxel arrays
+        return ORJSONResponse(occupancy_json_payload(result, request.occupancy_format, legacy_logits))
+
+    except Exception as e:
+        logger.error(f"Occupancy generation failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
 
-        result = await asyncio.to_thread(
-            generate_occupancy_field,
-            prompt=request.prompt,
-            resolution=request.grid_resolution,
+@app.post("/generate_occupancy_binary")
+async def generate_occupancy_binary(request: OccupancyRequest):
+    """
+    Generate occupancy field and return it as packed binary.
+
+    Same inputs as /generate_occupancy, but skips JSON encoding entirely: the
+    body is raw little-endian arrays (see occupancy_binary_payload) and the
+    shape information travels in X-* headers.
+    """
+    check_occupancy_request(request)
+
+    try:
+        result = await state.batcher.submit(request)
+        content, headers = occupancy_binary_payload(result, request.occupancy_format)
+        return Response(content=content, media_type="application/octet-stream", headers=headers)
+
+    except Exception as e:
+        logger.error(f"Occupancy generation failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
+
+@app.post("/generate_occupancy_stream")
+async def generate_occupancy_stream(request: OccupancyRequest):
+    """
+    Generate occupancy field and stream voxels back as NDJSON.
+
+    Voxels are sent as soon as each decoder batch is thresholded, so large
+    resolutions never hold the full voxel list in memory. Lines:
+    - first: {"resolution", "grid_size", "bbox_min", "bbox_max"}
+    - then any number of {"voxels": [[x,y,z], ...]}
+    - last: {"done": true, "voxel_count", "metadata"} (or {"error": ...})
+
+    Colors and raw logits need the whole field and are not supported here;
+    neither are hierarchical queries or occupancy formats other than 'voxels'.
+    """
+    check_occupancy_request(request)
+    if request.color_mode or request.include_logits or request.hierarchical:
+        raise HTTPException(
+            status_code=400,
+            detail="color_mode, include_logits and hierarchical are not supported by the streaming endpoint",
+        )
+    if request.occupancy_format != "voxels":
+        raise HTTPException(
+            status_code=400,
+            detail=f"occupancy_format '{request.occupancy_format}' is not supported by the streaming endpoint "
+                   f"(voxels are always streamed as [x, y, z] lists)",
+        )
+
+    start_time = time.time()
+    try:
+        latents = await run_on_gpu(
+            generate_latents,
+            [request.prompt],
             seed=request.seed,
             guidance_scale=request.guidance_scale,
             top_p=request.top_p,
-            bounding_box_xyz=bbox,
-            threshold=request.threshold,
-            include_logits=request.include_logits,
-            color_mode=request.color_mode,
-            base_color=base_color,
+            bounding_box_xyz=tuple(request.bounding_box_xyz) if request.bounding_box_xyz else None,
         )
-        return result
-
     except Exception as e:
         logger.error(f"Occupancy generation failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
+    async def ndjson_lines():
+        _, _, grid_size = await run_on_gpu(
+            get_dense_grid, request.grid_resolution, state.device
+        )
+        yield orjson.dumps({
+            "resolution": request.grid_resolution,
+            "grid_size": [int(n) for n in grid_size],
+            "bbox_min": _BBOX_MIN_LIST,
+            "bbox_max": _BBOX_MAX_LIST,
+        }) + b"\n"
+
+        chunks = iter_occupied_voxel_chunks(latents, request.grid_resolution, request.threshold)
+        voxel_count = 0
+        try:
+            while True:
+                voxels = await run_on_gpu(next, chunks, None)
+                if voxels is None:
+                    break
+                if len(voxels):
+                    voxel_count += len(voxels)
+                    yield orjson.dumps({"voxels": voxels}, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+        except Exception as e:
+            logger.error(f"Occupancy streaming failed: {e}", exc_info=True)
+            yield orjson.dumps({"error": str(e)}) + b"\n"
+            return
+
+        metadata = GenerationMetadata(
+            generation_time_secs=time.time() - start_time,
+            seed_used=request.seed,
+            model_version=state.model_version,
+        )
+        yield orjson.dumps({
+            "done": True,
+            "voxel_count": voxel_count,
+            "metadata": metadata.model_dump(),
+        }) + b"\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 
 @app.get("/")
 async def root():
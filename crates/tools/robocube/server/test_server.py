@@ -0,0 +1,58 @@
+"""
+Tests for the NumPy helpers in server.py that map between flat grid indices
+and voxel coordinates.
+
+Run with: pytest test_server.py (needs torch, fastapi and the other server
+dependencies, but no models or GPU)
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("fastapi")
+
+import server
+
+
+def make_index_grid(resolution: int) -> np.ndarray:
+    """Query grid whose point coordinates are their own (x, y, z) indices"""
+    n = resolution + 1
+    bbox_min = np.zeros(3)
+    bbox_max = np.full(3, float(resolution))
+    grid = server.make_grid_on_device(bbox_min, bbox_max, resolution, server.torch.device("cpu"))
+    assert grid.shape == (n * n * n, 3)
+    return np.rint(grid.numpy()).astype(np.int32)
+
+
+def test_unravel_voxels_matches_grid_layout():
+    resolution = 4
+    n = resolution + 1
+    expected = make_index_grid(resolution)
+
+    voxels = server.unravel_voxels(np.arange(n * n * n), [n, n, n])
+
+    assert voxels.dtype == np.int32
+    np.testing.assert_array_equal(voxels, expected)
+
+
+def test_occupancy_bitmask_sets_flat_grid_bits():
+    resolution = 4
+    n = resolution + 1
+    grid = make_index_grid(resolution)
+    flat_indices = np.array([0, 1, n, n * n, 7, n * n * n - 1])
+    flat_indices.sort()
+    result = server.OccupancyResult(
+        resolution=resolution,
+        bbox_min=[0.0, 0.0, 0.0],
+        bbox_max=[float(resolution)] * 3,
+        occupied_voxels=server.unravel_voxels(flat_indices, [n, n, n]).tolist(),
+    )
+
+    bits = np.unpackbits(
+        np.frombuffer(server.occupancy_bitmask(result), dtype=np.uint8), bitorder='little'
+    )[:n * n * n]
+
+    np.testing.assert_array_equal(np.flatnonzero(bits), flat_indices)
+    # Set bits point at the same grid points as occupied_voxels, in order
+    np.testing.assert_array_equal(grid[np.flatnonzero(bits)], result.occupied_voxels)
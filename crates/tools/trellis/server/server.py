@@ -11,15 +11,24 @@ import sys
 import asyncio
 import logging
 import base64
+import binascii
+import hashlib
+import json
+import threading
+import time
+import contextlib
+import multiprocessing
+import multiprocessing.connection
+from collections import OrderedDict
 from io import BytesIO
-from typing import Optional, List
+from typing import Optional, List, Tuple, Union
 from pathlib import Path
 
 import torch
 import numpy as np
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError
 from PIL import Image
 
 # Trellis imports
@@ -32,6 +41,34 @@ except ImportError as e:
     TRELLIS_AVAILABLE = False
     IMPORT_ERROR = str(e)
 
+# Optional weight quantization for the flow models
+try:
+    from torchao.quantization import quantize_, int8_weight_only, float8_weight_only
+    TORCHAO_AVAILABLE = True
+except ImportError:
+    TORCHAO_AVAILABLE = False
+
+# Attention backend selection (torch >= 2.3)
+try:
+    from torch.nn.attention import sdpa_kernel, SDPBackend
+    SDPA_KERNEL_AVAILABLE = True
+except ImportError:
+    SDPA_KERNEL_AVAILABLE = False
+
+# Optional: SIMD base64 decoding
+try:
+    import pybase64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    PYBASE64_AVAILABLE = False
+
+# Optional: libjpeg-turbo bindings for faster JPEG decode
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -51,6 +88,10 @@ class GenerateRequest(BaseModel):
     shape_slat_sampling_steps: int = Field(12, ge=1, le=100, description="Shape SLAT sampling steps")
     tex_slat_guidance_strength: float = Field(3.0, ge=0.0, le=20.0, description="Texture SLAT guidance strength")
     tex_slat_sampling_steps: int = Field(12, ge=1, le=100, description="Texture SLAT sampling steps")
+    mesh_format: str = Field(
+        "arrays",
+        description="Mesh encoding: 'arrays' (nested JSON lists) or 'packed' (base64 little-endian buffers)",
+    )
 
 
 class TrellisResult(BaseModel):
@@ -59,6 +100,15 @@ class TrellisResult(BaseModel):
     faces: List[List[int]] = Field(..., description="Mesh triangle faces [[i1,i2,i3], ...]")
     vertex_colors: Optional[List[List[float]]] = Field(None, description="Per-vertex RGB colors (0.0-1.0 range)")
     vertex_normals: Optional[List[List[float]]] = Field(None, description="Per-vertex normals [[nx,ny,nz], ...]")
+    mesh_format: Optional[str] = Field(None, description="Mesh encoding used: 'arrays' or 'packed'")
+    vertex_count: Optional[int] = Field(None, description="Number of vertices (packed format)")
+    face_count: Optional[int] = Field(None, description="Number of faces (packed format)")
+    vertices_b64: Optional[str] = Field(None, description="Packed format: base64 float32 LE vertex positions [N,3]")
+    faces_b64: Optional[str] = Field(None, description="Packed format: base64 uint32 LE face indices [M,3]")
+    vertex_colors_b64: Optional[str] = Field(None, description="Packed format: base64 float32 LE vertex colors [N,3]")
+    vertex_normals_b64: Optional[str] = Field(None, description="Packed format: base64 float32 LE vertex normals [N,3]")
+    # Pooled pinned buffers backing the arrays; see release_result_buffers
+    _host_buffers: list = PrivateAttr(default_factory=list)
 
 
 class HealthResponse(BaseModel):
@@ -71,6 +121,40 @@ class HealthResponse(BaseModel):
     error: Optional[str] = Field(None, description="Error message if status is 'error'")
 
 
+class HostBufferPool:
+    """
+    Size-bucketed pool of pinned host buffers for mesh downloads.
+
+    Sizes are rounded up to 2048-element chunks so one buffer serves many
+    mesh sizes. Buffers come back through release() once a response has been
+    serialized; buffers never released (cached results) are simply freed.
+    """
+
+    CHUNK = 2048
+
+    def __init__(self, max_per_size: int = 4):
+        self.max_per_size = max_per_size
+        self.lock = threading.Lock()
+        self.free = {}
+
+    def acquire(self, numel: int, dtype: torch.dtype) -> torch.Tensor:
+        """A pinned 1-D buffer of at least numel elements"""
+        size = -(-max(numel, 1) // self.CHUNK) * self.CHUNK
+        with self.lock:
+            bucket = self.free.get((size, dtype))
+            if bucket:
+                return bucket.pop()
+        return torch.empty(size, dtype=dtype, pin_memory=True)
+
+    def release(self, buffers: List[torch.Tensor]):
+        """Return buffers whose contents are no longer needed"""
+        with self.lock:
+            for buf in buffers:
+                bucket = self.free.setdefault((buf.numel(), buf.dtype), [])
+                if len(bucket) < self.max_per_size:
+                    bucket.append(buf)
+
+
 # Global state
 class ServerState:
     """Global server state for model management"""
@@ -78,20 +162,298 @@ class ServerState:
         self.pipeline = None
         self.loading = False
         self.error = None
+        self.batcher = None
+        # GPU worker processes (TRELLIS_GPU_WORKERS > 1); None runs in-process
+        self.worker_pool = None
+        # Sparse structure noise buffers, keyed by shape
+        self.noise_buf = {}
+        self.jpeg_decoder = None
+        self.channels_last = False
+        # Resize request images on the GPU when the pipeline runs in-process
+        self.gpu_resize = os.getenv("TRELLIS_GPU_RESIZE", "1") == "1"
+        # Pinned host staging for image uploads: shape -> (buffer, copy-done event)
+        self.pinned_bufs = {}
+        # Pinned host buffers for mesh downloads, recycled after serialization
+        self.host_pool = HostBufferPool(int(os.getenv("TRELLIS_HOST_POOL", "4")))
+        # Captured sparse structure flow steps, keyed by input shapes
+        self.use_cuda_graphs = os.getenv("TRELLIS_CUDA_GRAPHS", "1") == "1"
+        self.flow_graphs = {}
+        # LRU of finished results for repeat (image, params) requests
+        self.cache_size = int(os.getenv("TRELLIS_RESULT_CACHE", "16"))
+        self.cache_lock = threading.Lock()
+        self.result_cache: "OrderedDict[str, TrellisResult]" = OrderedDict()
+        # Set once the startup warmup inference has run (TRELLIS_WARMUP)
+        self.warmed_up = False
 
     @property
     def models_loaded(self) -> bool:
-        return self.pipeline is not None
+        if self.worker_pool is not None:
+            return self.worker_pool.ready > 0
+        return self.warmed_up and self.pipeline is not None
 
 
 state = ServerState()
 app = FastAPI(
     title="Trellis.2 Inference Server",
     description="FastAPI server for Trellis.2 image-to-3D generation",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 
 
+class FlowGraph:
+    """
+    CUDA graph of one sparse structure flow-model step at fixed shapes.
+
+    Every sampler step calls the flow model with identically shaped dense
+    inputs, so the step is captured once and replayed with inputs copied into
+    static buffers. The output is cloned because classifier-free guidance
+    calls the model twice per step.
+    """
+
+    def __init__(self, model, x_t: torch.Tensor, t: torch.Tensor, cond: torch.Tensor):
+        self.x_t = x_t.clone()
+        self.t = t.clone()
+        self.cond = cond.clone()
+
+        # Autocast's weight cache must be off while capturing
+        autocast = torch.autocast(device_type='cuda', dtype=torch.bfloat16, cache_enabled=False)
+
+        # Warm up on a side stream so lazy initialization happens before capture
+        warmup_stream = torch.cuda.Stream(x_t.device)
+        warmup_stream.wait_stream(torch.cuda.current_stream(x_t.device))
+        with torch.cuda.stream(warmup_stream), autocast:
+            for _ in range(2):
+                model(self.x_t, self.t, self.cond)
+        torch.cuda.current_stream(x_t.device).wait_stream(warmup_stream)
+
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self.graph), autocast:
+            self.output = model(self.x_t, self.t, self.cond)
+
+    def run(self, x_t: torch.Tensor, t: torch.Tensor, cond: torch.Tensor) -> torch.Tensor:
+        self.x_t.copy_(x_t)
+        self.t.copy_(t)
+        self.cond.copy_(cond)
+        self.graph.replay()
+        return self.output.clone()
+
+
+def get_flow_graph(model, x_t: torch.Tensor, t: torch.Tensor, cond: torch.Tensor) -> Optional[FlowGraph]:
+    """
+    Return the cached FlowGraph for these input shapes, capturing it on first use.
+
+    Returns None (eager steps) off CUDA, when disabled via TRELLIS_CUDA_GRAPHS=0,
+    or after a failed capture.
+    """
+    if not state.use_cuda_graphs or x_t.device.type != 'cuda' or cond is None:
+        return None
+
+    key = (id(model), tuple(x_t.shape), x_t.dtype, tuple(cond.shape), cond.dtype)
+    if key not in state.flow_graphs:
+        try:
+            state.flow_graphs[key] = FlowGraph(model, x_t, t, cond)
+            logger.info(f"Captured CUDA graph for sparse structure flow step {tuple(x_t.shape)}")
+        except Exception as e:
+            logger.warning(f"CUDA graph capture failed, using eager sampler steps: {e}")
+            state.flow_graphs[key] = None
+    return state.flow_graphs[key]
+
+
+def upload_pixels(pixels: np.ndarray) -> torch.Tensor:
+    """
+    Copy an HxWx3 uint8 image to the GPU through a reused pinned buffer.
+
+    Pinned memory lets the copy run asynchronously (non_blocking) instead of
+    being staged through a driver bounce buffer. Before a buffer is refilled,
+    the previous copy out of it is waited on.
+    """
+    key = pixels.shape
+    entry = state.pinned_bufs.get(key)
+    if entry is None:
+        entry = (torch.empty(key, dtype=torch.uint8, pin_memory=True), torch.cuda.Event())
+        state.pinned_bufs[key] = entry
+    staging, copied = entry
+    copied.synchronize()
+    staging.numpy()[...] = pixels
+    gpu = staging.to('cuda', non_blocking=True)
+    copied.record()
+    return gpu
+
+
+def fetch_arrays(values: dict) -> Tuple[dict, List[torch.Tensor]]:
+    """
+    Copy mesh tensors to contiguous NumPy arrays with a single synchronization.
+
+    `values` maps name -> (tensor or array or None, NumPy dtype). CUDA tensors
+    are cast on the GPU and copied non_blocking into pinned buffers from
+    state.host_pool, then the stream is synchronized once. Returns the arrays
+    and the pooled buffers backing them, for release after serialization.
+    """
+    arrays = {}
+    buffers = []
+    pending = False
+    for name, (value, dtype) in values.items():
+        if value is None:
+            arrays[name] = None
+        elif torch.is_tensor(value) and value.is_cuda:
+            # Mesh data is float32 or uint32 indices; CUDA has no uint32 cast, and
+            # int32 holds the same bytes for any index below 2**31
+            torch_dtype = torch.int32 if dtype == np.uint32 else torch.float32
+            buf = state.host_pool.acquire(value.numel(), torch_dtype)
+            buffers.append(buf)
+            host = buf[:value.numel()].view(value.shape)
+            host.copy_(value.detach().to(torch_dtype), non_blocking=True)
+            arrays[name] = (host, dtype)
+            pending = True
+        else:
+            if torch.is_tensor(value):
+                value = value.detach().cpu().numpy()
+            arrays[name] = np.ascontiguousarray(value, dtype=dtype)
+    if pending:
+        torch.cuda.current_stream().synchronize()
+    for name, value in arrays.items():
+        if isinstance(value, tuple):
+            host, dtype = value
+            arrays[name] = host.numpy().view(dtype)
+    return arrays, buffers
+
+
+def release_result_buffers(result: TrellisResult):
+    """Recycle a serialized result's pinned buffers; its arrays must not be used afterwards"""
+    state.host_pool.release(result._host_buffers)
+    result._host_buffers = []
+
+
+# Scalar reads of CUDA tensors each block on the GPU; inside a per-vertex
+# loop that means one sync (and kernel launch) per element
+_sync_guard = threading.local()
+
+
+def install_sync_guard():
+    """
+    Make .item(), float(), int() and .tolist() on CUDA tensors raise inside
+    no_scalar_syncs() blocks (TRELLIS_SYNC_GUARD=1, for debugging).
+
+    The check is per thread, so other requests are unaffected.
+    """
+    def guarded(name, original):
+        def method(self, *args, **kwargs):
+            if getattr(_sync_guard, 'active', False) and self.is_cuda:
+                raise RuntimeError(f"Tensor.{name} on a CUDA tensor inside no_scalar_syncs()")
+            return original(self, *args, **kwargs)
+        return method
+
+    for name in ('item', '__float__', '__int__', 'tolist'):
+        original = getattr(torch.Tensor, name)
+        if not getattr(original, '_sync_guarded', False):
+            method = guarded(name, original)
+            method._sync_guarded = True
+            setattr(torch.Tensor, name, method)
+    logger.info("Sync guard installed: scalar reads of CUDA tensors raise during mesh extraction")
+
+
+@contextlib.contextmanager
+def no_scalar_syncs():
+    """Mark a block that must not read CUDA tensors element by element"""
+    _sync_guard.active = True
+    try:
+        yield
+    finally:
+        _sync_guard.active = False
+
+
+def timestep_tensor(sampler, t: float, batch_size: int, device) -> torch.Tensor:
+    """
+    Fill the sampler's reusable bfloat16 timestep buffer and return the first
+    batch_size entries.
+
+    Avoids building a Python list and uploading a tiny tensor on every
+    sampler step. The buffer is reallocated only when a larger batch arrives.
+    """
+    buf = getattr(sampler, '_t_buf', None)
+    if buf is None or buf.shape[0] < batch_size or buf.device != torch.device(device):
+        buf = torch.empty(batch_size, device=device, dtype=torch.bfloat16)
+        sampler._t_buf = buf
+    t_tensor = buf[:batch_size]
+    t_tensor.fill_(t)
+    return t_tensor
+
+
+# Per-thread sampling state read by the patched sample_sparse_structure
+_sampling = threading.local()
+
+
+_seed_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def seeded_noise(seed: Optional[int], device):
+    """
+    Draw this request's sparse structure noise from a dedicated generator.
+
+    SLAT noise comes from the pipeline's own torch.randn calls, so for a
+    seeded run the CPU generator and the current CUDA device's generator are
+    seeded inside a forked RNG state and restored afterwards. Unlike
+    torch.manual_seed this never touches other CUDA devices, and the lock
+    keeps two seeded runs from interleaving. With seed None the default
+    generators are used.
+    """
+    if seed is None:
+        _sampling.generator = None
+        yield
+        return
+    device = torch.device(device)
+    cuda_devices = [device.index if device.index is not None else torch.cuda.current_device()] if device.type == "cuda" else []
+    _sampling.generator = torch.Generator(device=device).manual_seed(seed)
+    with _seed_lock, torch.random.fork_rng(devices=cuda_devices):
+        torch.default_generator.manual_seed(seed)
+        if cuda_devices:
+            torch.cuda.manual_seed(seed)
+        try:
+            yield
+        finally:
+            _sampling.generator = None
+
+
+def fused_attention():
+    """
+    Restrict scaled_dot_product_attention to the fused kernels.
+
+    Flash attention is preferred, with memory-efficient attention as the
+    fallback for shapes/dtypes flash does not support; the unfused math path
+    is excluded. No-op off CUDA or on torch versions without sdpa_kernel.
+    """
+    if SDPA_KERNEL_AVAILABLE and torch.cuda.is_available():
+        return sdpa_kernel([SDPBackend.FLASH_ATTENTION, SDPBackend.EFFICIENT_ATTENTION])
+    return contextlib.nullcontext()
+
+
+def quantize_flow_models(mode: str):
+    """
+    Quantize the flow models' Linear weights to 8 bits (weight-only).
+
+    Activations stay bfloat16 and no calibration data is needed. 'fp8' needs
+    an Ada/Hopper/Blackwell GPU (sm_89+); 'int8' runs on any CUDA GPU. The
+    sparse structure decoder keeps full precision.
+    """
+    if not TORCHAO_AVAILABLE:
+        logger.warning("torchao not installed - skipping flow model quantization")
+        return
+    if mode not in ("int8", "fp8"):
+        logger.warning(f"Unsupported TRELLIS_QUANTIZE mode '{mode}'")
+        return
+    if mode == "fp8" and torch.cuda.get_device_capability() < (8, 9):
+        logger.warning("fp8 weights need sm_89 or newer - skipping flow model quantization")
+        return
+
+    for name in ("sparse_structure_flow_model", "slat_flow_model"):
+        model = state.pipeline.models.get(name)
+        if model is not None:
+            quantize_(model, int8_weight_only() if mode == "int8" else float8_weight_only())
+            logger.info(f"  {name}: quantized weights to {mode}")
+
+
 # Model loading
 async def load_models():
     """Load Trellis.2 pipeline"""
@@ -114,6 +476,10 @@ async def load_models():
                 del test_tensor
                 cuda_available = True
                 logger.info("CUDA is available and working")
+                torch.backends.cuda.enable_flash_sdp(True)
+                torch.backends.cuda.enable_mem_efficient_sdp(True)
+                # Dense conv shapes are fixed per resolution, so autotuning pays off
+                torch.backends.cudnn.benchmark = True
             except RuntimeError as e:
                 logger.warning(f"CUDA available but not functional: {e}")
                 logger.warning("Will use CPU - inference will be slow")
@@ -180,6 +546,18 @@ async def load_models():
         # This is necessary because TRELLIS hardcodes .float() but we need bfloat16 for RTX 5090
         if hasattr(state.pipeline, 'encode_image'):
             original_encode_image = state.pipeline.encode_image
+            # Resize -> scale to bfloat16 -> normalize, built once and reused for every
+            # request (compiled into fused kernels with TRELLIS_COMPILE=1)
+            import torch.nn as nn
+            from torchvision.transforms import v2
+            image_transform = nn.Sequential(
+                v2.Resize([518, 518], antialias=True),
+                v2.ToDtype(torch.bfloat16, scale=True),
+                state.pipeline.image_cond_model_transform,
+            )
+            if cuda_available and os.getenv("TRELLIS_COMPILE", "0") == "1":
+                image_transform = torch.compile(image_transform, dynamic=True)
+
             def encode_image_bfloat16(image):
                 import torch.nn.functional as F
                 from PIL import Image as PILImage
@@ -190,21 +568,22 @@ async def load_models():
                     if image.ndim == 3:
                         image = image.unsqueeze(0)
                     assert image.ndim == 4, "Image tensor should be batched (B, C, H, W)"
+                    # Apply transform and ensure bfloat16
+                    image = image.to(device='cuda', dtype=torch.bfloat16)
+                    image = state.pipeline.image_cond_model_transform(image).to(dtype=torch.bfloat16)
                 elif isinstance(image, list):
                     assert all(isinstance(i, PILImage.Image) for i in image), "Image list should be list of PIL images"
-                    image = [i.resize((518, 518), PILImage.LANCZOS) for i in image]
-                    image = [np.array(i.convert('RGB')).astype(np.float32) / 255 for i in image]
-                    image = [torch.from_numpy(i).permute(2, 0, 1) for i in image]
-                    image = torch.stack(image).to(device='cuda', dtype=torch.bfloat16)
+                    # Upload uint8 pixels and resize/scale/normalize on the GPU
+                    # (a quarter of the bytes of a float32 upload, no CPU resample)
+                    image = torch.cat([
+                        image_transform(upload_pixels(np.asarray(i.convert('RGB'), dtype=np.uint8)).permute(2, 0, 1)[None])
+                        for i in image
+                    ])
                 else:
                     raise ValueError(f"Unsupported type of image: {type(image)}")
 
-                # Ensure image is bfloat16
-                if image.dtype != torch.bfloat16:
-                    image = image.to(dtype=torch.bfloat16)
-
-                # Apply transform and ensure bfloat16
-                image = state.pipeline.image_cond_model_transform(image).to(device='cuda', dtype=torch.bfloat16)
+                if state.channels_last:
+                    image = image.contiguous(memory_format=torch.channels_last)
                 features = state.pipeline.models['image_cond_model'](image, is_training=True)['x_prenorm']
                 patchtokens = F.layer_norm(features, features.shape[-1:])
                 return patchtokens
@@ -212,6 +591,13 @@ async def load_models():
             state.pipeline.encode_image = encode_image_bfloat16
             logger.info("Patched encode_image to use bfloat16 for RTX 5090 compatibility")
 
+        # Optionally run the image encoder's conv stem in NHWC (TRELLIS_CHANNELS_LAST=1)
+        image_cond_model = state.pipeline.models.get('image_cond_model')
+        if cuda_available and image_cond_model is not None and os.getenv("TRELLIS_CHANNELS_LAST", "0") == "1":
+            image_cond_model.to(memory_format=torch.channels_last)
+            state.channels_last = True
+            logger.info("image_cond_model: converted to channels_last")
+
         # Monkey-patch sparse_structure_sampler._inference_model to use bfloat16 timestamps
         # IMPORTANT: Patch instance methods, not the class, to avoid conflicts between samplers
         import types
@@ -229,9 +615,13 @@ async def load_models():
                 def inference_model_bfloat16_sparse(self, model, x_t, t, cond=None, **kwargs):
                     # For sparse structure sampling with dense tensors
                     # Note: sparse_structure_flow doesn't accept **kwargs, only (x, t, cond)
-                    t_tensor = torch.tensor([1000 * t] * x_t.shape[0], device=x_t.device, dtype=torch.bfloat16)
+                    t_tensor = timestep_tensor(self, 1000 * t, x_t.shape[0], x_t.device)
                     if cond is not None and cond.shape[0] == 1 and x_t.shape[0] > 1:
                         cond = cond.repeat(x_t.shape[0], *([1] * (len(cond.shape) - 1)))
+                    # Replay the captured step when available
+                    graph = get_flow_graph(model, x_t, t_tensor, cond)
+                    if graph is not None:
+                        return graph.run(x_t, t_tensor, cond)
                     with torch.autocast(device_type='cuda', dtype=torch.bfloat16):
                         return model(x_t, t_tensor, cond)
 
@@ -252,13 +642,14 @@ async def load_models():
                 def inference_model_bfloat16_slat(self, model, x_t, t, cond=None, **kwargs):
                     # For SLAT sampling with sparse tensors
                     if hasattr(x_t, 'features'):
-                        batch_size = 1
+                        # SparseTensor.shape[0] is the number of batch items
+                        batch_size = x_t.shape[0]
                         device = x_t.features.device
                     else:
                         batch_size = x_t.shape[0]
                         device = x_t.device
 
-                    t_tensor = torch.tensor([1000 * t] * batch_size, device=device, dtype=torch.bfloat16)
+                    t_tensor = timestep_tensor(self, 1000 * t, batch_size, device)
                     if cond is not None and cond.shape[0] == 1 and batch_size > 1:
                         cond = cond.repeat(batch_size, *([1] * (len(cond.shape) - 1)))
 
@@ -271,9 +662,10 @@ async def load_models():
                 sampler._inference_model = types.MethodType(inference_model_bfloat16_slat, sampler)
                 logger.info("Patched slat_sampler._inference_model (instance method)")
 
-        # Patch custom norm layers to handle bfloat16 weights
-        # The norm layers (LayerNorm32/GroupNorm32) call x.float() but expect float32 weights
-        # We need to patch them to temporarily convert weights to float32 during forward pass
+        # Keep custom norm layers' parameters in float32
+        # The norm layers (LayerNorm32/GroupNorm32) call x.float() and expect float32 weights,
+        # so cast their weight/bias once here instead of flipping dtypes on every forward.
+        # Assigning .data leaves the rest of the decoder in bfloat16.
         decoder = state.pipeline.models.get('sparse_structure_decoder')
         if decoder is not None:
             # Set decoder's dtype attribute to bfloat16 to match the actual weights
@@ -281,43 +673,37 @@ async def load_models():
             decoder.use_fp16 = False  # We're using bfloat16, not float16
 
             import torch.nn as nn
-            from functools import wraps
 
             norm_layer_count = 0
             for module in decoder.modules():
-                # Check if it's a custom norm layer (has the signature of calling x.float())
                 if isinstance(module, (nn.LayerNorm, nn.GroupNorm)):
-                    # Save original forward
-                    original_forward = module.forward
-
-                    def make_patched_forward(orig_forward, mod):
-                        @wraps(orig_forward)
-                        def patched_forward(x):
-                            # Temporarily convert weights/bias to float32 for this forward pass
-                            orig_weight_dtype = mod.weight.dtype if mod.weight is not None else None
-                            orig_bias_dtype = mod.bias.dtype if mod.bias is not None else None
-
-                            if mod.weight is not None:
-                                mod.weight.data = mod.weight.data.float()
-                            if mod.bias is not None:
-                                mod.bias.data = mod.bias.data.float()
-
-                            # Call original forward (which calls x.float() internally)
-                            result = orig_forward(x)
-
-                            # Restore original dtypes
-                            if mod.weight is not None and orig_weight_dtype is not None:
-                                mod.weight.data = mod.weight.data.to(orig_weight_dtype)
-                            if mod.bias is not None and orig_bias_dtype is not None:
-                                mod.bias.data = mod.bias.data.to(orig_bias_dtype)
-
-                            return result
-                        return patched_forward
-
-                    module.forward = make_patched_forward(original_forward, module)
+                    if module.weight is not None:
+                        module.weight.data = module.weight.data.float()
+                    if module.bias is not None:
+                        module.bias.data = module.bias.data.float()
                     norm_layer_count += 1
 
-            logger.info(f"Patched {norm_layer_count} norm layers to handle bfloat16 weights")
+            logger.info(f"Cast {norm_layer_count} norm layers to float32 weights")
+
+        if os.getenv("TRELLIS_SYNC_GUARD", "0") == "1":
+            install_sync_guard()
+
+        quantize_mode = os.getenv("TRELLIS_QUANTIZE")
+        if cuda_available and quantize_mode:
+            quantize_flow_models(quantize_mode)
+
+        # Optionally compile the dense sparse-structure models. The SLAT flow model
+        # runs on sparse tensors whose sizes vary per image, so it stays eager.
+        if cuda_available and os.getenv("TRELLIS_COMPILE", "0") == "1":
+            compile_mode = os.getenv("TRELLIS_COMPILE_MODE", "reduce-overhead")
+            for name in ("sparse_structure_flow_model", "sparse_structure_decoder"):
+                model = state.pipeline.models.get(name)
+                if model is not None:
+                    state.pipeline.models[name] = torch.compile(model, mode=compile_mode, dynamic=False)
+                    logger.info(f"  {name}: compiled ({compile_mode})")
+            # reduce-overhead and max-autotune manage their own CUDA graphs
+            if compile_mode in ("reduce-overhead", "max-autotune"):
+                state.use_cuda_graphs = False
 
         # Patch sample_sparse_structure to convert sampler output to bfloat16
         # The sampler outputs float16 from autocast, but decoder weights are bfloat16
@@ -326,7 +712,13 @@ async def load_models():
             # Replicate original logic from trellis_image_to_3d.py line 176-193
             flow_model = self.models['sparse_structure_flow_model']
             reso = flow_model.resolution
-            noise = torch.randn(num_samples, flow_model.in_channels, reso, reso, reso).to(self.device)
+            # Draw noise straight into a reused device buffer (no host tensor or H2D copy)
+            shape = (num_samples, flow_model.in_channels, reso, reso, reso)
+            noise = state.noise_buf.get(shape)
+            if noise is None:
+                noise = torch.empty(shape, device=self.device)
+                state.noise_buf[shape] = noise
+            torch.randn(shape, out=noise, generator=getattr(_sampling, 'generator', None))
             sampler_params = {**self.sparse_structure_sampler_params, **sampler_params}
 
             # Extract neg_cond separately - sampler needs it but flow model doesn't
@@ -352,7 +744,12 @@ async def load_models():
 
             # Decode occupancy latent - decoder is in bfloat16
             decoder = self.models['sparse_structure_decoder']
-            coords = torch.argwhere(decoder(z_s)>0)[:, [0, 2, 3, 4]].int()
+            occupancy = decoder(z_s) > 0
+            if occupancy.shape[1] == 1:
+                # Single channel: index the (B, X, Y, Z) volume directly, no gather
+                coords = torch.stack(torch.nonzero(occupancy.squeeze(1), as_tuple=True), dim=1).int()
+            else:
+                coords = torch.argwhere(occupancy)[:, [0, 2, 3, 4]].int()
             return coords
 
         state.pipeline.sample_sparse_structure = types.MethodType(
@@ -361,39 +758,114 @@ async def load_models():
         )
         logger.info("Patched sample_sparse_structure to convert sampler output to bfloat16")
 
+        if cuda_available and os.getenv("TRELLIS_WARMUP", "1") == "1":
+            await asyncio.to_thread(warmup_models)
+        state.warmed_up = True
+
         logger.info("Model loading complete")
-        # models_loaded is a property based on pipeline being not None
+        # models_loaded is a property based on pipeline being set and warmed up
         state.error = None
 
     except Exception as e:
         logger.error(f"Failed to load models: {e}", exc_info=True)
         state.error = str(e)
         state.pipeline = None
+        state.warmed_up = False
 
     finally:
         state.loading = False
 
 
-def decode_base64_image(base64_str: str) -> Image.Image:
+def warmup_models():
+    """
+    Run one short dummy inference so the first request doesn't pay for warmup.
+
+    Triggers cuBLAS/cuDNN handle creation, cudnn.benchmark algorithm selection,
+    torch.compile autotuning and flow graph capture before /health reports
+    ready. The image is an opaque square on a transparent background, so
+    preprocessing crops it by alpha without running background removal.
+    """
+    logger.info("Warming up pipeline (2 sampling steps per stage)")
+    start = time.time()
+    image = Image.new("RGBA", (64, 64), (0, 0, 0, 0))
+    image.paste((128, 128, 128, 255), (16, 16, 48, 48))
+    try:
+        result = run_inference(
+            image=preprocess_image(image, 1024),
+            seed=0,
+            ss_sampling_steps=2,
+            shape_slat_sampling_steps=2,
+            tex_slat_sampling_steps=2,
+        )
+        release_result_buffers(result)
+        torch.cuda.synchronize()
+        logger.info(f"Warmup complete in {time.time() - start:.1f}s")
+    except Exception as e:
+        # A failed warmup only costs first-request latency; still serve
+        logger.warning(f"Warmup inference failed: {e}")
+
+
+def decode_base64_image(base64_str: str, min_size: Optional[int] = None) -> Image.Image:
     """
     Decode base64 string to PIL Image.
 
     Args:
         base64_str: Base64-encoded image (with or without data URI prefix)
+        min_size: If set, JPEGs may be downscaled during decode (1/2, 1/4, 1/8)
+            as long as both sides stay at least this large
 
     Returns:
         PIL Image
     """
     # Remove data URI prefix if present (e.g., "data:image/png;base64,")
-    if "base64," in base64_str:
-        base64_str = base64_str.split("base64,")[1]
+    # Slicing copies the payload once; split() would also copy the prefix part
+    prefix_end = base64_str.find("base64,")
+    if prefix_end != -1:
+        base64_str = base64_str[prefix_end + len("base64,"):]
+
+    # Decode base64 to bytes (SIMD decoder when available; binascii skips
+    # b64decode's wrapper otherwise)
+    if PYBASE64_AVAILABLE:
+        image_bytes = pybase64.b64decode(base64_str, validate=False)
+    else:
+        image_bytes = binascii.a2b_base64(base64_str)
+
+    return decode_image_bytes(image_bytes, min_size)
+
+
+def decode_image_bytes(image_bytes: bytes, min_size: Optional[int] = None) -> Image.Image:
+    """
+    Decode raw PNG/JPEG/etc. bytes to an RGB PIL Image.
 
-    # Decode base64 to bytes
-    image_bytes = base64.b64decode(base64_str)
+    Args:
+        image_bytes: Encoded image file contents
+        min_size: See decode_base64_image
+
+    Returns:
+        PIL Image
+    """
+    # JPEGs decode straight to RGB through libjpeg-turbo when available
+    if TURBOJPEG_AVAILABLE and image_bytes[:3] == b"\xff\xd8\xff":
+        if state.jpeg_decoder is None:
+            state.jpeg_decoder = TurboJPEG()
+        scaling_factor = None
+        if min_size is not None:
+            width, height, _, _ = state.jpeg_decoder.decode_header(image_bytes)
+            for denominator in (8, 4, 2):
+                if min(width, height) // denominator >= min_size:
+                    scaling_factor = (1, denominator)
+                    break
+        pixels = state.jpeg_decoder.decode(image_bytes, pixel_format=TJPF_RGB, scaling_factor=scaling_factor)
+        return Image.fromarray(pixels)
 
     # Open image with PIL
     image = Image.open(BytesIO(image_bytes))
 
+    # For JPEGs, let libjpeg scale down while decoding (skips IDCT work);
+    # draft() keeps both sides >= min_size and is a no-op for other formats
+    if min_size is not None:
+        image.draft("RGB", (min_size, min_size))
+
     # Convert to RGB if needed (remove alpha channel)
     if image.mode != "RGB":
         image = image.convert("RGB")
@@ -420,13 +892,27 @@ def preprocess_image(image: Image.Image, resolution: int) -> Image.Image:
     scale = max(resolution / width, resolution / height)
     new_width = int(width * scale)
     new_height = int(height * scale)
+    left = (new_width - resolution) // 2
+    top = (new_height - resolution) // 2
+
+    # With an in-process pipeline the GPU is already initialized here; worker
+    # pool mode keeps CUDA out of the API process and resizes on the CPU
+    if state.gpu_resize and state.pipeline is not None and torch.cuda.is_available():
+        from torchvision.transforms.v2 import functional as TF
+        from torchvision.transforms import InterpolationMode
+
+        # Antialiased bilinear resize on the GPU, then center crop by slicing
+        pixels = torch.from_numpy(np.asarray(image, dtype=np.uint8)).to('cuda').permute(2, 0, 1).float()
+        pixels = TF.resize(pixels, [new_height, new_width], interpolation=InterpolationMode.BILINEAR, antialias=True)
+        pixels = pixels[:, top:top + resolution, left:left + resolution]
+        # The pipeline's own preprocessing (background removal) needs a PIL image
+        pixels = pixels.round_().clamp_(0, 255).to(torch.uint8).permute(1, 2, 0).contiguous()
+        return Image.fromarray(pixels.cpu().numpy())
 
     # Resize with high-quality resampling
     image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
 
     # Center crop to target size
-    left = (new_width - resolution) // 2
-    top = (new_height - resolution) // 2
     image = image.crop((left, top, left + resolution, top + resolution))
 
     return image
@@ -448,37 +934,148 @@ def extract_mesh_data(result) -> TrellisResult:
     # Assuming result has mesh attribute with vertices and faces
     mesh = result.mesh if hasattr(result, 'mesh') else result
 
-    # Extract vertices (Nx3 array of positions)
-    vertices = mesh.vertices.cpu().numpy() if torch.is_tensor(mesh.vertices) else mesh.vertices
-    vertices = vertices.tolist()
-
-    # Extract faces (Mx3 array of vertex indices)
-    faces = mesh.faces.cpu().numpy() if torch.is_tensor(mesh.faces) else mesh.faces
-    faces = faces.tolist()
-
-    # Extract colors if available (Nx3 array of RGB values)
-    vertex_colors = None
-    if hasattr(mesh, 'vertex_colors') and mesh.vertex_colors is not None:
-        colors = mesh.vertex_colors.cpu().numpy() if torch.is_tensor(mesh.vertex_colors) else mesh.vertex_colors
-        vertex_colors = colors.tolist()
-
-    # Extract normals if available (Nx3 array of normals)
-    vertex_normals = None
-    if hasattr(mesh, 'vertex_normals') and mesh.vertex_normals is not None:
-        normals = mesh.vertex_normals.cpu().numpy() if torch.is_tensor(mesh.vertex_normals) else mesh.vertex_normals
-        vertex_normals = normals.tolist()
-
-    return TrellisResult(
-        vertices=vertices,
-        faces=faces,
-        vertex_colors=vertex_colors,
-        vertex_normals=vertex_normals
-    )
+    # Vertices/colors/normals are Nx3, faces Mx3 vertex indices. All four
+    # come back to the host in one batch of async copies and a single sync,
+    # as contiguous buffers; no Python lists
+    with no_scalar_syncs():
+        arrays, buffers = fetch_arrays({
+            'vertices': (mesh.vertices, np.float32),
+            'faces': (mesh.faces, np.uint32),
+            'vertex_colors': (getattr(mesh, 'vertex_colors', None), np.float32),
+            'vertex_normals': (getattr(mesh, 'vertex_normals', None), np.float32),
+        })
+
+    # Built without validation: the arrays stay NumPy until mesh_json_payload
+    # hands them to ORJSONResponse
+    result = TrellisResult.model_construct(**arrays)
+    result._host_buffers = buffers
+    return result
+
+
+def mesh_json_payload(result: TrellisResult, mesh_format: str = "arrays") -> dict:
+    """
+    Convert a TrellisResult into data for ORJSONResponse.
+
+    NumPy arrays are passed through untouched; orjson serializes them natively
+    (OPT_SERIALIZE_NUMPY), so dense meshes never get boxed into per-float
+    Python objects or revalidated by Pydantic. In the 'packed' format the
+    arrays are sent as base64 little-endian buffers instead (float32 for
+    positions/colors/normals, uint32 for faces) and the list fields are empty.
+    """
+    if mesh_format != "packed":
+        return {
+            "vertices": result.vertices,
+            "faces": result.faces,
+            "vertex_colors": result.vertex_colors,
+            "vertex_normals": result.vertex_normals,
+            "mesh_format": "arrays",
+        }
+
+    # SIMD base64 when pybase64 is installed; these are the largest strings we emit
+    b64encode = pybase64.b64encode if PYBASE64_AVAILABLE else base64.b64encode
+
+    def pack(values, dtype):
+        if values is None:
+            return None
+        return b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode("ascii")
+
+    return {
+        "vertices": [],
+        "faces": [],
+        "mesh_format": "packed",
+        "vertex_count": len(result.vertices),
+        "face_count": len(result.faces),
+        "vertices_b64": pack(result.vertices, "<f4"),
+        "faces_b64": pack(result.faces, "<u4"),
+        "vertex_colors_b64": pack(result.vertex_colors, "<f4"),
+        "vertex_normals_b64": pack(result.vertex_normals, "<f4"),
+    }
+
+
+def mesh_binary_sections(result: TrellisResult) -> Tuple[List[np.ndarray], dict]:
+    """
+    Arrays making up a binary mesh body, and the headers describing them.
+
+    Body layout (little-endian, concatenated):
+    - vertices: float32 [X-Vertex-Count, 6] interleaved (x, y, z, nx, ny, nz)
+      if X-Has-Normals is 1, else float32 [X-Vertex-Count, 3] positions;
+      X-Vertex-Stride gives the bytes per vertex (24 or 12)
+    - faces: uint32 [X-Face-Count, 3]
+    - vertex colors: float16 [X-Vertex-Count, 3], only if X-Has-Colors is 1
+
+    Each section can be cast in place to a GPU vertex/index buffer.
+    """
+    positions = np.asarray(result.vertices, dtype='<f4')
+    if result.vertex_normals is not None:
+        vertices = np.empty((len(positions), 6), dtype='<f4')
+        vertices[:, :3] = positions
+        vertices[:, 3:] = result.vertex_normals
+    else:
+        vertices = np.ascontiguousarray(positions)
+    sections = [vertices, np.ascontiguousarray(result.faces, dtype='<u4')]
+    if result.vertex_colors is not None:
+        # Colors are 0-1; half precision is ample and halves their bytes
+        sections.append(np.ascontiguousarray(result.vertex_colors, dtype='<f2'))
+    headers = {
+        "X-Vertex-Count": str(len(positions)),
+        "X-Vertex-Stride": str(vertices.shape[1] * 4),
+        "X-Face-Count": str(len(result.faces)),
+        "X-Has-Colors": "1" if result.vertex_colors is not None else "0",
+        "X-Has-Normals": "1" if result.vertex_normals is not None else "0",
+        "Content-Length": str(sum(section.nbytes for section in sections)),
+    }
+    return sections, headers
+
+
+def stream_sections(sections: List[np.ndarray], chunk_size: int = 1 << 20, on_done=None):
+    """
+    Yield the raw bytes of each array in chunk_size pieces.
+
+    Only one chunk is copied at a time, so the body never exists as a second
+    full-size buffer next to the arrays. on_done runs once everything was sent
+    (or the client went away).
+    """
+    try:
+        for section in sections:
+            # Flat byte view; unlike memoryview.cast this also takes empty
+            # multi-dimensional arrays (a mesh with no faces)
+            flat = np.ascontiguousarray(section).reshape(-1).view(np.uint8)
+            for start in range(0, len(flat), chunk_size):
+                yield flat[start:start + chunk_size].tobytes()
+    finally:
+        if on_done is not None:
+            on_done()
+
 
+def prepare_image(image: Union[str, bytes], resolution: str) -> Image.Image:
+    """
+    Decode and resize a request image.
 
-@torch.no_grad()
+    Args:
+        image: Base64-encoded image, or raw image file bytes (/generate_upload)
+        resolution: Image resolution (512, 1024, or 1536)
+
+    Returns:
+        Preprocessed PIL Image
+    """
+    resolution_int = int(resolution)
+    if resolution_int not in [512, 1024, 1536]:
+        raise ValueError(f"Invalid resolution: {resolution}. Must be 512, 1024, or 1536")
+
+    if isinstance(image, bytes):
+        logger.info("Decoding uploaded image")
+        pil_image = decode_image_bytes(image, min_size=resolution_int)
+    else:
+        logger.info("Decoding base64 image")
+        pil_image = decode_base64_image(image, min_size=resolution_int)
+
+    logger.info(f"Preprocessing image to {resolution_int}x{resolution_int}")
+    return preprocess_image(pil_image, resolution_int)
+
+
+@torch.inference_mode()
 def run_inference(
-    image: str,
+    image: Union[str, Image.Image],
     seed: Optional[int] = 42,
     resolution: str = "1024",
     ss_guidance_strength: float = 7.5,
@@ -492,7 +1089,7 @@ def run_inference(
     Run Trellis.2 inference on an image.
 
     Args:
-        image: Base64-encoded image
+        image: Base64-encoded image, or an image already decoded by prepare_image
         seed: Random seed (None for random)
         resolution: Image resolution (512, 1024, or 1536)
         ss_guidance_strength: Sparse structure guidance strength
@@ -505,26 +1102,11 @@ def run_inference(
     Returns:
         TrellisResult with mesh data
     """
-    if not state.models_loaded:
+    if state.pipeline is None:
         raise RuntimeError("Models not loaded - check /health endpoint")
 
-    # Set random seed for reproducibility
-    if seed is not None:
-        torch.manual_seed(seed)
-        np.random.seed(seed)
-        if torch.cuda.is_available():
-            torch.cuda.manual_seed_all(seed)
-
-    # Decode and preprocess image
-    logger.info("Decoding base64 image")
-    pil_image = decode_base64_image(image)
-
-    resolution_int = int(resolution)
-    if resolution_int not in [512, 1024, 1536]:
-        raise ValueError(f"Invalid resolution: {resolution}. Must be 512, 1024, or 1536")
-
-    logger.info(f"Preprocessing image to {resolution_int}x{resolution_int}")
-    pil_image = preprocess_image(pil_image, resolution_int)
+    pil_image = prepare_image(image, resolution) if isinstance(image, str) else image
+    pipeline = state.pipeline
 
     # Run Trellis pipeline
     logger.info(f"Running Trellis inference (seed: {seed})")
@@ -542,29 +1124,465 @@ def run_inference(
         "cfg_strength": shape_slat_guidance_strength,
     }
 
-    # Run pipeline - models are already in bfloat16, samplers handle dtype conversion
+    # Run the pipeline stages directly - models are already in bfloat16, samplers
+    # handle dtype conversion. pipeline.run is skipped because it reseeds every
+    # CUDA device through torch.manual_seed; seeded_noise seeds only this one.
     # Do NOT set default dtype globally as it breaks custom norm layers
-    result = state.pipeline.run(
-        pil_image,
-        seed=seed,
-        sparse_structure_sampler_params=sparse_structure_sampler_params,
-        slat_sampler_params=slat_sampler_params,
-    )
+    with fused_attention(), seeded_noise(seed, pipeline.device):
+        cond = pipeline.get_cond([pipeline.preprocess_image(pil_image)])
+        coords = pipeline.sample_sparse_structure(cond, 1, sparse_structure_sampler_params)
+        slat = pipeline.sample_slat(cond, coords, slat_sampler_params)
+        outputs = pipeline.decode_slat(slat, ["mesh"])
 
     # Extract mesh data
     logger.info("Extracting mesh data from result")
-    mesh_result = extract_mesh_data(result)
+    mesh_result = extract_mesh_data(outputs["mesh"][0])
 
     logger.info(f"Inference complete - vertices: {len(mesh_result.vertices)}, faces: {len(mesh_result.faces)}")
     return mesh_result
 
 
+@torch.inference_mode()
+def run_inference_batch(requests: List[GenerateRequest], images: List[Image.Image]) -> List[TrellisResult]:
+    """
+    Run one Trellis pipeline pass for several unseeded requests.
+
+    All requests must share resolution and sampler parameters. The images are
+    conditioned together and sampled with num_samples=len(requests), so each
+    flow-model forward covers the whole batch.
+
+    Args:
+        requests: Requests to generate together
+        images: Their images, decoded by prepare_image
+
+    Returns:
+        One TrellisResult per request, in order
+    """
+    if state.pipeline is None:
+        raise RuntimeError("Models not loaded - check /health endpoint")
+
+    first = requests[0]
+    pipeline = state.pipeline
+    images = [pipeline.preprocess_image(image) for image in images]
+
+    logger.info(f"Running batched Trellis inference ({len(requests)} images)")
+    sparse_structure_sampler_params = {
+        "steps": first.ss_sampling_steps,
+        "cfg_strength": first.ss_guidance_strength,
+    }
+    slat_sampler_params = {
+        "steps": first.shape_slat_sampling_steps,
+        "cfg_strength": first.shape_slat_guidance_strength,
+    }
+
+    # Same stages as pipeline.run, with one conditioning row per image
+    with fused_attention():
+        cond = pipeline.get_cond(images)
+        coords = pipeline.sample_sparse_structure(cond, len(images), sparse_structure_sampler_params)
+        slat = pipeline.sample_slat(cond, coords, slat_sampler_params)
+        outputs = pipeline.decode_slat(slat, ["mesh"])
+
+    results = [extract_mesh_data(mesh) for mesh in outputs["mesh"]]
+    logger.info(f"Batched inference complete - {len(results)} meshes")
+    return results
+
+
+def result_cache_key(request: GenerateRequest, image_bytes: Optional[bytes] = None) -> Optional[str]:
+    """
+    Hash a request's image and parameters for the result cache.
+
+    Hashes image_bytes when given (uploads), else the base64 payload. Returns
+    None for unseeded requests, whose output is random by design.
+    """
+    if request.seed is None or state.cache_size <= 0:
+        return None
+    if image_bytes is None:
+        image = request.image
+        prefix_end = image.find("base64,")
+        if prefix_end != -1:
+            image = image[prefix_end + len("base64,"):]
+        image_bytes = image.encode()
+    params = request.model_dump(exclude={"image", "mesh_format"})
+    digest = hashlib.sha256(image_bytes)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def cache_get(key: str) -> Optional[TrellisResult]:
+    """Look up a cached result and mark it most recently used"""
+    with state.cache_lock:
+        result = state.result_cache.get(key)
+        if result is not None:
+            state.result_cache.move_to_end(key)
+        return result
+
+
+def cache_put(key: str, result: TrellisResult):
+    """Store a result, evicting the least recently used past cache_size"""
+    with state.cache_lock:
+        state.result_cache[key] = result
+        state.result_cache.move_to_end(key)
+        while len(state.result_cache) > state.cache_size:
+            state.result_cache.popitem(last=False)
+
+
+class GenerateBatcher:
+    """
+    Coalesces concurrent /generate requests into batched pipeline runs.
+
+    Each pipeline (the in-process one, or one per GPU worker process) runs one
+    group at a time. While groups run, new requests queue up; the worker then
+    waits at most `max_delay` seconds (or until `max_batch` are pending) and
+    groups requests sharing resolution and sampler parameters. Seeded requests always run
+    alone so their output does not depend on what else was in flight.
+    """
+
+    def __init__(self, max_batch: int = 4, max_delay: float = 0.05, concurrency: int = 1):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # One group in flight per pipeline (in-process or worker replica)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+
+    async def submit(self, request: GenerateRequest, image_bytes: Optional[bytes] = None) -> TrellisResult:
+        """
+        Queue a request and wait for its result (or reuse a cached one).
+
+        The image comes from request.image (base64) unless raw image_bytes
+        are given.
+        """
+        key = None
+        if request.seed is not None and state.cache_size > 0:
+            # Hashing a multi-megabyte payload stays off the event loop
+            key = await asyncio.to_thread(result_cache_key, request, image_bytes)
+        if key is not None:
+            cached = cache_get(key)
+            if cached is not None:
+                logger.info("Serving cached Trellis result")
+                return cached
+
+        # Decode on a worker thread before queueing, so it overlaps whatever
+        # the pipeline is running instead of delaying the next group
+        image = image_bytes if image_bytes is not None else request.image
+        pil_image = await asyncio.to_thread(prepare_image, image, request.resolution)
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, pil_image, future))
+        result = await future
+        if key is not None:
+            cache_put(key, result)
+        return result
+
+    async def run(self):
+        """Worker loop: collect pending requests and run them in groups"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for item in pending:
+                request = item[0]
+                key = (
+                    request.resolution,
+                    request.ss_guidance_strength,
+                    request.ss_sampling_steps,
+                    request.shape_slat_guidance_strength,
+                    request.shape_slat_sampling_steps,
+                    request.tex_slat_guidance_strength,
+                    request.tex_slat_sampling_steps,
+                    # Seeded requests are never coalesced
+                    id(item) if request.seed is not None else None,
+                )
+                groups.setdefault(key, []).append(item)
+
+            # Wait for a free pipeline per group; requests arriving meanwhile
+            # queue up for the next batch
+            for group in groups.values():
+                await self.slots.acquire()
+                task = asyncio.create_task(self._run_group(group))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+    async def _run_group(self, group):
+        """Run one group through the pipeline and resolve its futures"""
+        requests = [request for request, _, _ in group]
+        images = [pil_image for _, pil_image, _ in group]
+        try:
+            if state.worker_pool is not None:
+                results = await state.worker_pool.run(requests, images)
+            else:
+                results = await asyncio.to_thread(run_group, requests, images)
+        except Exception as e:
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.slots.release()
+
+        for (_, _, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+
+def release_cached_memory():
+    """
+    Return cached CUDA blocks to the driver when fragmentation builds up.
+
+    empty_cache() synchronizes and makes the next request re-allocate, so
+    it only runs once reserved-but-unallocated memory exceeds
+    TRELLIS_EMPTY_CACHE_MB (default 1024).
+    """
+    if state.pipeline is None or not torch.cuda.is_available():
+        return
+    slack = torch.cuda.memory_reserved() - torch.cuda.memory_allocated()
+    if slack > int(os.getenv("TRELLIS_EMPTY_CACHE_MB", "1024")) * 1024 * 1024:
+        torch.cuda.empty_cache()
+        logger.info(f"Released {slack / 2**20:.0f} MB of cached CUDA memory")
+
+
+def run_group(requests: List[GenerateRequest], images: List[Image.Image]) -> List[TrellisResult]:
+    """Run a batcher group on this process's pipeline"""
+    try:
+        if len(requests) > 1:
+            return run_inference_batch(requests, images)
+        request = requests[0]
+        return [run_inference(
+            image=images[0],
+            seed=request.seed,
+            resolution=request.resolution,
+            ss_guidance_strength=request.ss_guidance_strength,
+            ss_sampling_steps=request.ss_sampling_steps,
+            shape_slat_guidance_strength=request.shape_slat_guidance_strength,
+            shape_slat_sampling_steps=request.shape_slat_sampling_steps,
+            tex_slat_guidance_strength=request.tex_slat_guidance_strength,
+            tex_slat_sampling_steps=request.tex_slat_sampling_steps,
+        )]
+    finally:
+        release_cached_memory()
+
+
+# GPU worker processes
+def gpu_worker_main(worker_index: int, tasks, results):
+    """
+    Entry point of a GPU worker process.
+
+    Loads its own pipeline replica (on the GPU selected by the parent through
+    CUDA_VISIBLE_DEVICES), reports readiness, then runs batcher groups from
+    `tasks` until it receives None. Requests arrive without their base64
+    image, next to the already decoded PIL images. Each group is announced
+    as taken before it runs, so the parent knows which one to fail if this
+    process dies. Meshes go back as NumPy payload dicts.
+    """
+    asyncio.run(load_models())
+    results.put(("ready", worker_index, state.error))
+    if not state.models_loaded:
+        return
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, requests, images = task
+        results.put(("taken", worker_index, task_id))
+        try:
+            payloads = [mesh_json_payload(result) for result in run_group(requests, images)]
+            results.put((task_id, payloads, None))
+        except Exception as e:
+            logger.error(f"Worker {worker_index} inference failed: {e}", exc_info=True)
+            results.put((task_id, None, str(e)))
+
+
+class GpuWorkerPool:
+    """
+    Pipeline replicas in separate processes, one per GPU.
+
+    Each process owns a full pipeline, so Python-side work (preprocessing,
+    mesh extraction) in one request no longer holds the GIL for the others.
+    Groups are handed out through a shared multiprocessing queue; a collector
+    thread resolves the waiting asyncio futures as results come back.
+
+    A monitor thread watches the process sentinels. When a ready worker dies
+    (OOM kill, CUDA fault) the group it was running fails and the worker is
+    respawned; one that dies while loading counts as failed to load.
+    """
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self.ready = 0
+        self.reported = 0
+        self.errors = []
+        self.pending = {}
+        self.next_task_id = 0
+        self.lock = threading.Lock()
+        context = multiprocessing.get_context("spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.processes = [None] * num_workers
+        # Per worker: reported ready, and the task id it is running (or None)
+        self.worker_ready = [False] * num_workers
+        self.running = [None] * num_workers
+        self.context = context
+        # Worker i runs on the i-th device the parent can see
+        visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+        self.devices = visible.split(",") if visible else [str(i) for i in range(torch.cuda.device_count())]
+        if num_workers > len(self.devices):
+            raise RuntimeError(f"TRELLIS_GPU_WORKERS={num_workers} exceeds the {len(self.devices)} visible GPU(s)")
+
+    def start(self):
+        """Spawn the workers, the result collector and the process monitor"""
+        for i in range(self.num_workers):
+            self._spawn(i)
+        logger.info(f"Started {self.num_workers} GPU worker processes")
+        threading.Thread(target=self._collect, daemon=True, name="trellis-results").start()
+        threading.Thread(target=self._monitor, daemon=True, name="trellis-workers").start()
+
+    def _spawn(self, index: int):
+        """Start worker `index` on its GPU"""
+        # Spawned children inherit the environment at start(); the lock keeps a
+        # respawn from racing another spawn's temporary mask
+        with self.lock:
+            visible_devices = os.environ.get("CUDA_VISIBLE_DEVICES")
+            try:
+                os.environ["CUDA_VISIBLE_DEVICES"] = self.devices[index]
+                process = self.context.Process(
+                    target=gpu_worker_main, args=(index, self.tasks, self.results), daemon=True
+                )
+                process.start()
+            finally:
+                if visible_devices is None:
+                    os.environ.pop("CUDA_VISIBLE_DEVICES", None)
+                else:
+                    os.environ["CUDA_VISIBLE_DEVICES"] = visible_devices
+            self.processes[index] = process
+
+    def _monitor(self):
+        """Report worker deaths to the collector, in order after their last messages"""
+        reported = set()
+        while True:
+            with self.lock:
+                sentinels = {
+                    process: i for i, process in enumerate(self.processes) if process not in reported
+                }
+            # The timeout picks up respawned processes
+            dead = multiprocessing.connection.wait([process.sentinel for process in sentinels], timeout=1.0)
+            for process, index in sentinels.items():
+                if process.sentinel in dead:
+                    process.join()
+                    reported.add(process)
+                    self.results.put(("died", index, process.exitcode))
+
+    def _collect(self):
+        """Route worker messages to readiness state and waiting futures"""
+        while True:
+            task_id, payload, error = self.results.get()
+            if task_id == "ready":
+                self.worker_ready[payload] = error is None
+                self._report(payload, error)
+                continue
+            if task_id == "taken":
+                # ("taken", worker index, task id)
+                self.running[payload] = error
+                continue
+            if task_id == "died":
+                self._worker_died(payload, error)
+                continue
+
+            with self.lock:
+                entry = self.pending.pop(task_id, None)
+            for i, running in enumerate(self.running):
+                if running == task_id:
+                    self.running[i] = None
+            if entry is not None:
+                loop, future = entry
+                loop.call_soon_threadsafe(self._resolve, future, payload, error)
+
+    def _report(self, index: int, error: Optional[str]):
+        """Count a worker's load outcome; the first round ends startup"""
+        if error is None:
+            self.ready += 1
+            logger.info(f"GPU worker {index} ready")
+        elif self.reported < self.num_workers:
+            self.errors.append(f"worker {index}: {error}")
+        self.reported += 1
+        if self.reported == self.num_workers:
+            state.loading = False
+            state.error = "; ".join(self.errors) if self.ready == 0 else None
+
+    def _worker_died(self, index: int, exitcode):
+        """Fail the group a dead worker was running and respawn it if it had loaded"""
+        logger.error(f"GPU worker {index} exited (code {exitcode})")
+        task_id, self.running[index] = self.running[index], None
+        if task_id is not None:
+            with self.lock:
+                entry = self.pending.pop(task_id, None)
+            if entry is not None:
+                loop, future = entry
+                loop.call_soon_threadsafe(
+                    self._resolve, future, None, f"GPU worker {index} died (exit code {exitcode})"
+                )
+        if not self.worker_ready[index]:
+            # Died while loading; a failed load was already reported before a clean exit
+            if exitcode != 0:
+                self._report(index, f"exited while loading (code {exitcode})")
+            return
+        self.worker_ready[index] = False
+        self.ready -= 1
+        self._spawn(index)
+
+    @staticmethod
+    def _resolve(future, payload, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result([TrellisResult.model_construct(**mesh) for mesh in payload])
+
+    async def run(self, requests: List[GenerateRequest], images: List[Image.Image]) -> List[TrellisResult]:
+        """Send a group to the next free worker and wait for its meshes"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.lock:
+            task_id = self.next_task_id
+            self.next_task_id += 1
+            self.pending[task_id] = (loop, future)
+        # Workers only need the sampler settings and the decoded image; the
+        # base64 payload would be pickled through the queue for nothing
+        requests = [request.model_copy(update={"image": ""}) for request in requests]
+        await asyncio.to_thread(self.tasks.put, (task_id, requests, images))
+        return await future
+
+
 # API endpoints
 @app.on_event("startup")
 async def startup_event():
     """Initialize server on startup"""
     logger.info("Trellis.2 Inference Server starting...")
-    asyncio.create_task(load_models())
+    gpu_workers = int(os.getenv("TRELLIS_GPU_WORKERS", "1"))
+    if gpu_workers > 1:
+        # Each worker process loads its own replica; this process only dispatches
+        state.loading = True
+        state.worker_pool = GpuWorkerPool(gpu_workers)
+        state.worker_pool.start()
+    else:
+        asyncio.create_task(load_models())
+    state.batcher = GenerateBatcher(
+        max_batch=int(os.getenv("TRELLIS_MAX_BATCH", "4")),
+        max_delay=float(os.getenv("TRELLIS_BATCH_WAIT_MS", "50")) / 1000.0,
+        concurrency=gpu_workers,
+    )
+    asyncio.create_task(state.batcher.run())
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -587,7 +1605,16 @@ async def health():
     )
 
 
-@app.post("/generate", response_model=TrellisResult)
+def check_models_ready():
+    """Raise 503 unless the models are loaded"""
+    if not state.models_loaded:
+        if state.loading:
+            raise HTTPException(status_code=503, detail="Models still loading - try again in a moment")
+        else:
+            raise HTTPException(status_code=503, detail=f"Models failed to load: {state.error}")
+
+
+@app.post("/generate", response_model=TrellisResult, response_class=ORJSONResponse)
 async def generate(request: GenerateRequest):
     """
     Generate 3D mesh from image using Trellis.2.
@@ -611,31 +1638,112 @@ async def generate(request: GenerateRequest):
     }
     ```
     """
-    if not state.models_loaded:
-        if state.loading:
-            raise HTTPException(status_code=503, detail="Models still loading - try again in a moment")
-        else:
-            raise HTTPException(status_code=503, detail=f"Models failed to load: {state.error}")
+    check_models_ready()
+
+    if request.mesh_format not in ("arrays", "packed"):
+        raise HTTPException(status_code=400, detail=f"Invalid mesh_format: {request.mesh_format}. Must be 'arrays' or 'packed'")
 
     try:
-        result = await asyncio.to_thread(
-            run_inference,
-            image=request.image,
-            seed=request.seed,
-            resolution=request.resolution,
-            ss_guidance_strength=request.ss_guidance_strength,
-            ss_sampling_steps=request.ss_sampling_steps,
-            shape_slat_guidance_strength=request.shape_slat_guidance_strength,
-            shape_slat_sampling_steps=request.shape_slat_sampling_steps,
-            tex_slat_guidance_strength=request.tex_slat_guidance_strength,
-            tex_slat_sampling_steps=request.tex_slat_sampling_steps,
+        result = await state.batcher.submit(request)
+        # ORJSONResponse renders in its constructor, so the arrays are free after this
+        response = ORJSONResponse(mesh_json_payload(result, request.mesh_format))
+        if request.seed is None or state.cache_size <= 0:
+            # Not held by the result cache
+            release_result_buffers(result)
+        return response
+
+    except Exception as e:
+        logger.error(f"Inference failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Inference failed: {str(e)}")
+
+
+@app.post("/generate_upload", response_model=TrellisResult, response_class=ORJSONResponse)
+async def generate_upload(
+    http_request: Request,
+    seed: Optional[int] = 42,
+    resolution: str = "1024",
+    ss_guidance_strength: float = 7.5,
+    ss_sampling_steps: int = 12,
+    shape_slat_guidance_strength: float = 3.0,
+    shape_slat_sampling_steps: int = 12,
+    tex_slat_guidance_strength: float = 3.0,
+    tex_slat_sampling_steps: int = 12,
+    mesh_format: str = "arrays",
+):
+    """
+    Generate 3D mesh from a raw image upload.
+
+    The request body is the image file itself (PNG, JPEG, ...) rather than
+    base64 inside JSON, so there is no JSON parse and no base64 text to
+    decode. Parameters are query parameters with the same names and defaults
+    as /generate (a query string cannot express seed=null, so uploads are
+    always seeded).
+    """
+    check_models_ready()
+
+    try:
+        request = GenerateRequest(
+            image="",
+            seed=seed,
+            resolution=resolution,
+            ss_guidance_strength=ss_guidance_strength,
+            ss_sampling_steps=ss_sampling_steps,
+            shape_slat_guidance_strength=shape_slat_guidance_strength,
+            shape_slat_sampling_steps=shape_slat_sampling_steps,
+            tex_slat_guidance_strength=tex_slat_guidance_strength,
+            tex_slat_sampling_steps=tex_slat_sampling_steps,
+            mesh_format=mesh_format,
         )
-        return result
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
 
+    if request.mesh_format not in ("arrays", "packed"):
+        raise HTTPException(status_code=400, detail=f"Invalid mesh_format: {request.mesh_format}. Must be 'arrays' or 'packed'")
+
+    image_bytes = await http_request.body()
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="Request body must contain the image file")
+
+    try:
+        result = await state.batcher.submit(request, image_bytes)
+        response = ORJSONResponse(mesh_json_payload(result, request.mesh_format))
+        if request.seed is None or state.cache_size <= 0:
+            release_result_buffers(result)
+        return response
+
+    except Exception as e:
+        logger.error(f"Inference failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Inference failed: {str(e)}")
+
+
+@app.post("/generate_binary")
+async def generate_binary(request: GenerateRequest):
+    """
+    Generate 3D mesh from image and stream it back as packed binary.
+
+    Same inputs as /generate (mesh_format is ignored). The body is raw
+    little-endian arrays (see mesh_binary_sections) streamed in chunks, so
+    no JSON text or full-size copy of the mesh is ever built; counts and
+    optional sections are described by X-* headers.
+    """
+    check_models_ready()
+
+    try:
+        result = await state.batcher.submit(request)
+        # Interleaving copies the vertex arrays; keep that off the event loop
+        sections, headers = await asyncio.to_thread(mesh_binary_sections, result)
     except Exception as e:
         logger.error(f"Inference failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Inference failed: {str(e)}")
 
+    # Results not held by the result cache recycle their buffers once sent
+    uncached = request.seed is None or state.cache_size <= 0
+    return StreamingResponse(
+        stream_sections(sections, on_done=(lambda: release_result_buffers(result)) if uncached else None),
+        media_type="application/octet-stream",
+        headers=headers,
+    )
+
 
 @app.get("/")
 async def root():
@@ -657,13 +1765,35 @@ if __name__ == "__main__":
     host = os.getenv("TRELLIS_HOST", "0.0.0.0")
     port = int(os.getenv("TRELLIS_PORT", "3642"))
     workers = int(os.getenv("TRELLIS_WORKERS", "1"))
+    # Cap open connections (excess get 503) so large uploads can't pile up unbounded
+    limit_concurrency = int(os.getenv("TRELLIS_LIMIT_CONCURRENCY", "0")) or None
+    backlog = int(os.getenv("TRELLIS_BACKLOG", "2048"))
+
+    # Every uvicorn worker would create its own CUDA context and pipeline
+    # copy on the same GPU. One API process dispatching to the pipeline
+    # (in-process, or TRELLIS_GPU_WORKERS processes) serves the same load
+    if workers > 1 and torch.cuda.is_available():
+        logger.warning(
+            f"TRELLIS_WORKERS={workers} would load {workers} pipelines - running 1 API worker; "
+            f"use TRELLIS_GPU_WORKERS for more GPUs"
+        )
+        workers = 1
+
+    # uvloop and httptools come with uvicorn[standard]; fall back without them
+    import importlib.util
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
 
-    logger.info(f"Starting server on {host}:{port} with {workers} workers")
+    logger.info(f"Starting server on {host}:{port} with {workers} workers ({loop}, {http})")
 
     uvicorn.run(
         "server:app",
         host=host,
         port=port,
         workers=workers,
+        loop=loop,
+        http=http,
+        limit_concurrency=limit_concurrency,
+        backlog=backlog,
         log_level="info"
     )
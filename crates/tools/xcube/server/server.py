@@ -8,15 +8,21 @@ Provides text-to-3D generation using the XCube diffusion model.
 
 import os
 import sys
+import time
 import asyncio
 import logging
-from typing import Optional, List
+import threading
+import contextlib
+import functools
+import inspect
+from collections import OrderedDict
+from typing import Any, Optional, List, Tuple, Dict
 from pathlib import Path
 
 import torch
 import numpy as np
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from pydantic import BaseModel, Field
 
 
@@ -30,10 +36,10 @@ def test_cuda_works() -> tuple[bool, str | None]:
         return False, "CUDA not available"
 
     try:
-        # Try a simple tensor operation to verify kernels work
-        x = torch.randn(10, 10, device="cuda")
-        y = torch.matmul(x, x)
-        _ = y.sum().item()  # Force synchronization
+        # Launch one tiny kernel; fails with "no kernel image" on unsupported GPUs
+        x = torch.empty(1, device="cuda")
+        x.fill_(1.0)
+        torch.cuda.synchronize()
         return True, None
     except RuntimeError as e:
         error_msg = str(e)
@@ -47,45 +53,85 @@ def test_cuda_works() -> tuple[bool, str | None]:
 CUDA_WORKS = False
 CUDA_ERROR = None
 
+# Autocast dtypes for the denoisers and CLIP on CUDA (XCUBE_DTYPE)
+INFERENCE_DTYPES = {
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+    "fp32": torch.float32,
+}
+
 
 # XCube imports
 # These assume XCube is installed or available in PYTHONPATH
 try:
     import importlib
     from xcube.utils import exp
-    from transformers import CLIPTextModel, AutoProcessor
+    from transformers import CLIPTextModel, CLIPTokenizerFast
+
+    def create_model_from_args(config_path, ckpt_path, strict=True, device="cpu"):
+        """
+        Load XCube model from config and checkpoint.
 
-    def create_model_from_args(config_path, ckpt_path, strict=True):
-        """Load XCube model from config and checkpoint."""
+        A .safetensors checkpoint (the Lightning state_dict, converted once) is
+        memory-mapped and loaded straight onto `device`, into a model built
+        there, so weights skip the host-side copy of torch.load.
+        """
         model_yaml_path = Path(config_path)
         model_args = exp.parse_config_yaml(model_yaml_path)
         net_module = importlib.import_module("xcube.models." + model_args.model).Model
         args_ckpt = Path(ckpt_path)
         assert args_ckpt.exists(), f"Checkpoint does not exist: {args_ckpt}"
-        net_model = net_module.load_from_checkpoint(args_ckpt, hparams=model_args, strict=strict)
+        if args_ckpt.suffix == ".safetensors":
+            from safetensors.torch import load_file
+            with torch.device(device):
+                net_model = net_module(hparams=model_args)
+            net_model.load_state_dict(load_file(str(args_ckpt), device=str(device)), strict=strict)
+        else:
+            net_model = net_module.load_from_checkpoint(args_ckpt, hparams=model_args, strict=strict)
         return net_model.eval()
 
-    def padding_text_emb(text_emb, max_text_len=77):
-        """Pad text embedding to fixed length."""
-        padded_text_emb = torch.zeros(max_text_len, text_emb.shape[1])
-        padded_text_emb[:text_emb.shape[0]] = text_emb
-        mask = torch.zeros(max_text_len)
-        mask[:text_emb.shape[0]] = 1
-        return padded_text_emb, mask.bool()
+    def padding_text_emb(text_emb, max_text_len=77, out=None):
+        """Pad text embedding to fixed length, into preallocated (emb, mask) buffers if given."""
+        if out is None:
+            padded_text_emb = torch.zeros(max_text_len, text_emb.shape[1], device=text_emb.device)
+            mask = torch.zeros(max_text_len, dtype=torch.bool, device=text_emb.device)
+        else:
+            padded_text_emb, mask = out
+            padded_text_emb.zero_()
+            mask.zero_()
+        n = min(text_emb.shape[0], max_text_len)
+        padded_text_emb[:n].copy_(text_emb[:n])
+        mask[:n] = True
+        return padded_text_emb, mask
 
     def clip_preprocess(clip_tag='l14'):
-        """Get CLIP preprocessor."""
+        """Get CLIP tokenizer (Rust-backed fast tokenizer; only text is encoded)."""
         clip_names = {
             'l14': 'openai/clip-vit-large-patch14',
             'h14': 'laion/CLIP-ViT-H-14-laion2B-s32B-b79K'
         }
-        return AutoProcessor.from_pretrained(clip_names[clip_tag])
+        return CLIPTokenizerFast.from_pretrained(clip_names[clip_tag])
 
     XCUBE_AVAILABLE = True
 except ImportError as e:
     XCUBE_AVAILABLE = False
     IMPORT_ERROR = str(e)
 
+# Optional: 8-bit CLIP text encoder (XCUBE_CLIP_DTYPE=int8)
+try:
+    import bitsandbytes  # noqa: F401
+    from transformers import BitsAndBytesConfig
+    BITSANDBYTES_AVAILABLE = True
+except ImportError:
+    BITSANDBYTES_AVAILABLE = False
+
+# Optional: TensorRT denoiser engines (XCUBE_USE_TRT=1)
+try:
+    import tensorrt as trt
+    TENSORRT_AVAILABLE = True
+except ImportError:
+    TENSORRT_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -127,24 +173,454 @@ class ServerState:
     def __init__(self):
         self.coarse_model = None
         self.fine_model = None
+        # (config, checkpoint) of a fine model deferred by XCUBE_LAZY_FINE
+        self.fine_checkpoint = None
+        self.fine_lock = threading.Lock()
+        # TensorRT engine directory (XCUBE_TRT_DIR), resolved in load_models
+        self.trt_dir = None
         self.text_encoder = None
         self.clip_preprocess_fn = None
         self.loading = False
         self.error = None
+        # Resolved once in load_models (cuda when CUDA_WORKS, else cpu)
+        self.device = torch.device("cpu")
+        # Set once the startup warmup inference has run (XCUBE_WARMUP)
+        self.warmed_up = False
+        # Micro-batcher for /generate (created on startup)
+        self.batcher = None
+        # CLIP and diffusion run on separate CUDA streams (created in load_models)
+        self.text_stream = None
+        self.diff_stream = None
+        # Captured denoiser steps (XCUBE_CUDA_GRAPHS), keyed by model and input shapes.
+        # Off by default: XCube's fVDB denoisers take VDBTensors, which
+        # step_graph_key never captures, so only dense-tensor denoisers benefit
+        self.use_cuda_graphs = os.getenv("XCUBE_CUDA_GRAPHS", "0") == "1"
+        # Pinned staging for CLIP token uploads: name -> (buffer, copy-done event)
+        self.pinned_inputs = {}
+        self.pinned_lock = threading.Lock()
+        # Reused CLIP padding buffers: (max_text_len, emb_dim, device) -> (emb, mask)
+        self.padded_text_bufs = {}
+        self.padded_text_lock = threading.Lock()
+        # Pad prompts to the batch's longest (multiple of 8) instead of 77 tokens
+        self.dynamic_text_len = os.getenv("XCUBE_DYNAMIC_TEXT_LEN", "0") == "1"
+        # Set once compile_models has compiled the CLIP text model
+        self.text_compiled = False
+        self.dtype = INFERENCE_DTYPES.get(os.getenv("XCUBE_DTYPE", "bf16"), torch.bfloat16)
+        # LRU-bounded: each graph pins its own static buffers and memory pool
+        self.step_graphs_size = int(os.getenv("XCUBE_GRAPH_CACHE", "8"))
+        self.step_graphs: "OrderedDict[tuple, Optional[DenoiserGraph]]" = OrderedDict()
+        self.step_graphs_lock = threading.Lock()
 
     @property
     def models_loaded(self) -> bool:
-        return self.coarse_model is not None and self.text_encoder is not None
+        return self.warmed_up and self.coarse_model is not None and self.text_encoder is not None
 
 
 state = ServerState()
 app = FastAPI(
     title="XCube Inference Server",
     description="FastAPI server for XCube text-to-3D generation",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 
 
+def inference_autocast():
+    """Autocast context for model forwards: XCUBE_DTYPE on CUDA, a no-op for fp32 or CPU"""
+    if not CUDA_WORKS or state.dtype == torch.float32:
+        return contextlib.nullcontext()
+    return torch.autocast("cuda", dtype=state.dtype)
+
+
+def cuda_stream(stream):
+    """Run on a dedicated CUDA stream when one was created, else on the current stream"""
+    if stream is None:
+        return contextlib.nullcontext()
+    return torch.cuda.stream(stream)
+
+
+class RngGate:
+    """
+    Shares the global RNGs between unseeded groups, but gives a seeded group
+    them alone.
+
+    XCube builds whose evaluation_api takes no generator draw from the global
+    torch and NumPy RNGs, so with XCUBE_GPU_CONCURRENCY > 1 a seeded run must
+    not overlap any other group or its samples depend on what else was in
+    flight. Seeded runs wait for running groups to finish (new unseeded
+    groups queue behind a waiting seeded one), seed inside a forked RNG
+    state, and restore it afterwards.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.active = 0
+        self.seeded_waiting = 0
+        self.seeded_running = False
+
+    @contextlib.contextmanager
+    def shared(self):
+        with self.cond:
+            self.cond.wait_for(lambda: not self.seeded_running and self.seeded_waiting == 0)
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.active -= 1
+                self.cond.notify_all()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        with self.cond:
+            self.seeded_waiting += 1
+            self.cond.wait_for(lambda: not self.seeded_running and self.active == 0)
+            self.seeded_waiting -= 1
+            self.seeded_running = True
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.seeded_running = False
+                self.cond.notify_all()
+
+
+_rng_gate = RngGate()
+
+
+def accepts_generator(model) -> bool:
+    """Whether a model's evaluation_api takes an explicit torch.Generator"""
+    try:
+        return "generator" in inspect.signature(model.evaluation_api).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def generator_kwargs(model, generator: Optional[torch.Generator]) -> dict:
+    """evaluation_api kwargs passing the request's generator, if it takes one"""
+    if generator is None or not accepts_generator(model):
+        return {}
+    return {"generator": generator}
+
+
+@contextlib.contextmanager
+def seeded_rng(seed: Optional[int]):
+    """
+    Seed one inference without touching other requests' RNG streams.
+
+    Yields a dedicated torch.Generator (None when unseeded) to pass to
+    evaluation_api where it is accepted. XCube builds that draw from the
+    global RNGs instead get a forked torch/NumPy state for the duration,
+    restored afterwards; _rng_gate keeps every other group off the GPU
+    meanwhile (see RngGate).
+    """
+    if seed is None:
+        with _rng_gate.shared():
+            yield None
+        return
+    generator = torch.Generator(device=state.device).manual_seed(seed)
+    with _rng_gate.exclusive(), torch.random.fork_rng(devices=[torch.cuda.current_device()] if CUDA_WORKS else []):
+        np_state = np.random.get_state()
+        torch.manual_seed(seed)
+        np.random.seed(seed)
+        try:
+            yield generator
+        finally:
+            np.random.set_state(np_state)
+
+
+# CUDA graphs
+def find_denoiser_attr(model) -> Optional[str]:
+    """Return the attribute holding the denoiser a diffusion model calls once per DDIM step"""
+    for name in ("unet", "net"):
+        if isinstance(getattr(model, name, None), torch.nn.Module):
+            return name
+    return None
+
+
+def find_denoiser(model) -> Optional[torch.nn.Module]:
+    """Return the denoiser network a diffusion model calls once per DDIM step"""
+    attr = find_denoiser_attr(model)
+    return getattr(model, attr) if attr is not None else None
+
+
+def diffusion_models() -> List[Tuple[str, Any]]:
+    """The loaded diffusion models as (name, model) pairs"""
+    return [(name, model) for name, model in (("coarse", state.coarse_model), ("fine", state.fine_model))
+            if model is not None]
+
+
+def cast_denoiser_weights(models=None):
+    """
+    Store the denoiser weights in XCUBE_DTYPE (XCUBE_HALF_WEIGHTS=1).
+
+    Halves weight traffic on top of autocast. Normalization layers are kept in
+    fp32 and bf16/fp16 reductions still accumulate in fp32. bf16 needs sm80+;
+    XCube's sparse conv ops must accept the dtype, hence the opt-in flag.
+    """
+    if state.dtype == torch.float32:
+        logger.warning("XCUBE_HALF_WEIGHTS needs XCUBE_DTYPE=bf16 or fp16 - keeping fp32 weights")
+        return
+    if state.dtype == torch.bfloat16 and torch.cuda.get_device_capability()[0] < 8:
+        logger.warning("bf16 weights need an sm80+ GPU - keeping fp32 weights")
+        return
+    torch.backends.cuda.matmul.allow_bf16_reduced_precision_reduction = False
+    torch.backends.cuda.matmul.allow_fp16_reduced_precision_reduction = False
+    for name, model in models or diffusion_models():
+        denoiser = find_denoiser(model) if model is not None else None
+        if denoiser is None:
+            continue
+        denoiser.to(state.dtype)
+        for module in denoiser.modules():
+            if "Norm" in type(module).__name__:
+                module.float()
+        logger.info(f"Cast {name} denoiser weights to {state.dtype}")
+
+
+def compile_models(mode: str, skip=(), models=None, text_encoder: bool = True):
+    """
+    torch.compile the denoisers and the CLIP text transformer.
+
+    Modules are replaced in place on their parents, so evaluation_api and
+    encode_text pick up the compiled versions unchanged. Denoisers named in
+    `skip` (served by TensorRT) are left alone.
+    """
+    for name, model in models or diffusion_models():
+        attr = find_denoiser_attr(model) if model is not None else None
+        if attr is None or name in skip:
+            continue
+        setattr(model, attr, torch.compile(getattr(model, attr), mode=mode, fullgraph=False, dynamic=False))
+        logger.info(f"Compiled {name} denoiser ({mode})")
+    if text_encoder:
+        state.text_encoder.text_model = torch.compile(
+            state.text_encoder.text_model, mode=mode, fullgraph=False, dynamic=False
+        )
+        state.text_compiled = True
+        logger.info(f"Compiled CLIP text model ({mode})")
+
+
+class DenoiserGraph:
+    """
+    CUDA graph of one denoiser forward at fixed input shapes.
+
+    The DDIM loop calls the denoiser with identically shaped inputs on every
+    step, so the forward is captured once and replayed with the inputs copied
+    into static buffers, turning hundreds of kernel launches per step into a
+    single graph launch. Callers must hold `lock` while using the buffers.
+    """
+
+    def __init__(self, forward, args: tuple, kwargs: dict):
+        self.lock = threading.Lock()
+        self.args = [a.clone() if torch.is_tensor(a) else a for a in args]
+        self.kwargs = {k: v.clone() if torch.is_tensor(v) else v for k, v in kwargs.items()}
+
+        # Keep the caller's autocast, but its weight cache must be off while capturing
+        autocast = torch.autocast(
+            "cuda", dtype=state.dtype, enabled=torch.is_autocast_enabled(), cache_enabled=False
+        )
+
+        # Warm up on a side stream so cuBLAS/cuDNN pick their kernels before capture
+        warmup_stream = torch.cuda.Stream()
+        warmup_stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(warmup_stream), autocast:
+            for _ in range(3):
+                forward(*self.args, **self.kwargs)
+        torch.cuda.current_stream().wait_stream(warmup_stream)
+
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self.graph), autocast:
+            self.output = forward(*self.args, **self.kwargs)
+        if not torch.is_tensor(self.output):
+            raise TypeError(f"denoiser returned {type(self.output).__name__}, not a tensor")
+
+    def run(self, args: tuple, kwargs: dict) -> torch.Tensor:
+        for static, value in zip(self.args, args):
+            if torch.is_tensor(static):
+                static.copy_(value)
+        for key, value in kwargs.items():
+            if torch.is_tensor(value):
+                self.kwargs[key].copy_(value)
+        self.graph.replay()
+        # The next replay overwrites the output buffer
+        return self.output.clone()
+
+
+def step_graph_key(name: str, args: tuple, kwargs: dict):
+    """
+    Shape key for a denoiser call, or None if the call cannot be captured.
+
+    Only tensors (and None) are allowed as inputs: Python numbers such as a
+    timestep would be baked into the graph, and fVDB sparse tensors change
+    topology between requests.
+    """
+    signature = []
+    for value in list(args) + [kwargs[k] for k in sorted(kwargs)]:
+        if torch.is_tensor(value):
+            if not value.is_cuda:
+                return None
+            signature.append((tuple(value.shape), value.dtype))
+        elif value is None:
+            signature.append(None)
+        else:
+            return None
+    return (name, tuple(sorted(kwargs)), tuple(signature))
+
+
+def install_step_graph(model, name: str):
+    """
+    Route a diffusion model's denoiser forward through captured CUDA graphs.
+
+    Calls that cannot be captured (non-tensor inputs, failed capture) run
+    eagerly, so this is safe to install on any model. The objaverse
+    checkpoints' denoisers take fVDB VDBTensors and therefore always run
+    eagerly; the first such call is logged.
+    """
+    denoiser = find_denoiser(model)
+    if denoiser is None:
+        logger.warning(f"{name} model has no denoiser submodule - CUDA graphs disabled for it")
+        return
+    eager_forward = denoiser.forward
+    logged_eager = False
+
+    def forward(*args, **kwargs):
+        nonlocal logged_eager
+        if not state.use_cuda_graphs:
+            return eager_forward(*args, **kwargs)
+        key = step_graph_key(name, args, kwargs)
+        if key is None:
+            if not logged_eager:
+                logged_eager = True
+                logger.info(f"{name} denoiser inputs cannot be captured (e.g. VDBTensor) - running steps eagerly")
+            return eager_forward(*args, **kwargs)
+
+        with state.step_graphs_lock:
+            graph = state.step_graphs.get(key, False)
+            if graph is False:
+                try:
+                    graph = DenoiserGraph(eager_forward, args, kwargs)
+                    logger.info(f"Captured CUDA graph for {name} denoiser step")
+                except Exception as e:
+                    logger.warning(f"CUDA graph capture failed for {name} denoiser, using eager steps: {e}")
+                    graph = None
+                state.step_graphs[key] = graph
+                while len(state.step_graphs) > state.step_graphs_size:
+                    state.step_graphs.popitem(last=False)
+            else:
+                state.step_graphs.move_to_end(key)
+        if graph is None:
+            return eager_forward(*args, **kwargs)
+        with graph.lock:
+            return graph.run(args, kwargs)
+
+    denoiser.forward = forward
+
+
+# TensorRT
+def trt_torch_dtype(dtype) -> torch.dtype:
+    """torch dtype for a TensorRT tensor dtype"""
+    dtypes = {
+        trt.float32: torch.float32,
+        trt.float16: torch.float16,
+        trt.int32: torch.int32,
+        trt.int8: torch.int8,
+        trt.bool: torch.bool,
+    }
+    if hasattr(trt, "bfloat16"):
+        dtypes[trt.bfloat16] = torch.bfloat16
+    return dtypes[dtype]
+
+
+class TrtDenoiser:
+    """
+    A serialized TensorRT engine standing in for a denoiser forward.
+
+    Engines are built offline for fixed shapes, taking the denoiser's
+    positional tensor inputs in order. Inputs and outputs stay on the GPU and
+    the engine is enqueued on the current stream.
+    """
+
+    def __init__(self, engine_path: Path):
+        runtime = trt.Runtime(trt.Logger(trt.Logger.WARNING))
+        self.engine = runtime.deserialize_cuda_engine(engine_path.read_bytes())
+        if self.engine is None:
+            raise RuntimeError(f"Failed to deserialize TensorRT engine {engine_path}")
+        self.context = self.engine.create_execution_context()
+        names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        self.inputs = [n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT]
+        self.outputs = [n for n in names if n not in self.inputs]
+        self.input_shapes = [tuple(self.engine.get_tensor_shape(n)) for n in self.inputs]
+        self.lock = threading.Lock()
+
+    def matches(self, args, kwargs) -> bool:
+        """Whether a denoiser call fits this engine's static inputs"""
+        return (
+            not kwargs
+            and len(args) == len(self.inputs)
+            and all(
+                isinstance(arg, torch.Tensor) and arg.is_cuda and tuple(arg.shape) == shape
+                for arg, shape in zip(args, self.input_shapes)
+            )
+        )
+
+    def __call__(self, *args):
+        stream = torch.cuda.current_stream()
+        with self.lock:
+            # Converted inputs must outlive the enqueue; the caching allocator
+            # orders their reuse after this stream's work
+            inputs = []
+            for name, arg in zip(self.inputs, args):
+                arg = arg.contiguous().to(trt_torch_dtype(self.engine.get_tensor_dtype(name)))
+                self.context.set_tensor_address(name, arg.data_ptr())
+                inputs.append(arg)
+            outputs = []
+            for name in self.outputs:
+                out = torch.empty(
+                    tuple(self.context.get_tensor_shape(name)),
+                    dtype=trt_torch_dtype(self.engine.get_tensor_dtype(name)),
+                    device="cuda",
+                )
+                self.context.set_tensor_address(name, out.data_ptr())
+                outputs.append(out)
+            if not self.context.execute_async_v3(stream.cuda_stream):
+                raise RuntimeError("TensorRT execution failed")
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+def install_trt_engines(engine_dir: Path, models=None) -> set:
+    """
+    Serve denoiser forwards from TensorRT engines (<engine_dir>/<coarse|fine>.engine).
+
+    Calls that don't match an engine's static input shapes run the PyTorch
+    denoiser. Returns the names of models now backed by TensorRT.
+    """
+    if not TENSORRT_AVAILABLE:
+        logger.warning("XCUBE_USE_TRT=1 but tensorrt is not installed - using PyTorch denoisers")
+        return set()
+
+    installed = set()
+    for name, model in models or diffusion_models():
+        denoiser = find_denoiser(model) if model is not None else None
+        engine_path = engine_dir / f"{name}.engine"
+        if denoiser is None or not engine_path.exists():
+            continue
+        try:
+            engine = TrtDenoiser(engine_path)
+        except Exception as e:
+            logger.warning(f"Failed to load TensorRT engine {engine_path}, using PyTorch: {e}")
+            continue
+        eager_forward = denoiser.forward
+
+        def forward(*args, engine=engine, eager_forward=eager_forward, **kwargs):
+            if engine.matches(args, kwargs):
+                return engine(*args)
+            return eager_forward(*args, **kwargs)
+
+        denoiser.forward = forward
+        installed.add(name)
+        logger.info(f"Loaded TensorRT engine for {name} denoiser from {engine_path}")
+    return installed
+
+
 # Model loading
 async def load_models():
     """Load XCube models and CLIP text encoder"""
@@ -161,9 +637,16 @@ async def load_models():
             raise RuntimeError(f"XCube not available: {IMPORT_ERROR}")
 
         # Test if CUDA actually works (not just available)
-        CUDA_WORKS, CUDA_ERROR = test_cuda_works()
+        # Context creation happens here; keep it off the event loop
+        CUDA_WORKS, CUDA_ERROR = await asyncio.to_thread(test_cuda_works)
+        state.device = torch.device("cuda" if CUDA_WORKS else "cpu")
         if CUDA_WORKS:
             logger.info(f"CUDA working - using GPU: {torch.cuda.get_device_name(0)}")
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cudnn.benchmark = True
+            state.text_stream = torch.cuda.Stream()
+            state.diff_stream = torch.cuda.Stream()
         elif torch.cuda.is_available():
             logger.warning(f"CUDA detected but not working: {CUDA_ERROR}")
             logger.warning("Falling back to CPU - inference will be slow")
@@ -173,37 +656,60 @@ async def load_models():
         # Model paths (configurable via environment variables)
         checkpoint_dir = Path(os.getenv("XCUBE_CHECKPOINT_DIR", "./checkpoints"))
         config_coarse = checkpoint_dir / "objaverse_coarse" / "config.yaml"
-        ckpt_coarse = checkpoint_dir / "objaverse_coarse" / "last.ckpt"
+        ckpt_coarse = find_checkpoint(checkpoint_dir / "objaverse_coarse")
         config_fine = checkpoint_dir / "objaverse_fine" / "config.yaml"
-        ckpt_fine = checkpoint_dir / "objaverse_fine" / "last.ckpt"
+        ckpt_fine = find_checkpoint(checkpoint_dir / "objaverse_fine")
 
         # Verify checkpoint files exist
         for path in [config_coarse, ckpt_coarse]:
             if not path.exists():
                 raise FileNotFoundError(f"Missing checkpoint file: {path}")
 
-        logger.info(f"Loading coarse model from {ckpt_coarse}")
-        state.coarse_model = create_model_from_args(str(config_coarse), str(ckpt_coarse))
-        state.coarse_model = state.coarse_model.cuda() if CUDA_WORKS else state.coarse_model
-        state.coarse_model.eval()
+        state.coarse_model = load_diffusion_model(config_coarse, ckpt_coarse, "coarse")
 
-        # Fine model is optional
+        # Fine model is optional, and with XCUBE_LAZY_FINE=1 loaded by the first
+        # request that asks for it
         if config_fine.exists() and ckpt_fine.exists():
-            logger.info(f"Loading fine model from {ckpt_fine}")
-            state.fine_model = create_model_from_args(str(config_fine), str(ckpt_fine))
-            state.fine_model = state.fine_model.cuda() if CUDA_WORKS else state.fine_model
-            state.fine_model.eval()
+            if os.getenv("XCUBE_LAZY_FINE", "0") == "1":
+                state.fine_checkpoint = (config_fine, ckpt_fine)
+                logger.info("Fine model will load on first use_fine request")
+            else:
+                state.fine_model = load_diffusion_model(config_fine, ckpt_fine, "fine")
         else:
             logger.warning("Fine model checkpoints not found - fine generation disabled")
 
         # Load CLIP text encoder
         logger.info("Loading CLIP text encoder")
         clip_model_name = "openai/clip-vit-large-patch14"
-        state.text_encoder = CLIPTextModel.from_pretrained(clip_model_name)
-        state.text_encoder = state.text_encoder.cuda() if CUDA_WORKS else state.text_encoder
+        clip_dtype = os.getenv("XCUBE_CLIP_DTYPE", os.getenv("XCUBE_DTYPE", "bf16")) if CUDA_WORKS else "fp32"
+        if clip_dtype == "int8" and not BITSANDBYTES_AVAILABLE:
+            logger.warning("XCUBE_CLIP_DTYPE=int8 needs bitsandbytes - loading CLIP in fp16")
+            clip_dtype = "fp16"
+        if clip_dtype == "int8":
+            state.text_encoder = CLIPTextModel.from_pretrained(
+                clip_model_name,
+                quantization_config=BitsAndBytesConfig(load_in_8bit=True),
+                device_map={"": 0},
+            )
+        else:
+            state.text_encoder = CLIPTextModel.from_pretrained(
+                clip_model_name, torch_dtype=INFERENCE_DTYPES.get(clip_dtype, torch.float32)
+            )
+            state.text_encoder = state.text_encoder.to(state.device)
         state.text_encoder.eval()
+        logger.info(f"CLIP text encoder loaded ({clip_dtype})")
+
+        state.clip_preprocess_fn = clip_preprocess()  # Call to get CLIPTokenizerFast instance
+        encode_text_cached.cache_clear()
+        state.text_compiled = False
+        state.padded_text_bufs.clear()
 
-        state.clip_preprocess_fn = clip_preprocess()  # Call to get AutoProcessor instance
+        state.trt_dir = Path(os.getenv("XCUBE_TRT_DIR", str(checkpoint_dir / "trt")))
+        optimize_models(diffusion_models(), text_encoder=True)
+
+        if CUDA_WORKS and os.getenv("XCUBE_WARMUP", "1") == "1":
+            await asyncio.to_thread(warmup_models)
+        state.warmed_up = True
 
         logger.info("Model loading complete")
         state.error = None
@@ -213,122 +719,550 @@ async def load_models():
         state.error = str(e)
         state.coarse_model = None
         state.fine_model = None
+        state.fine_checkpoint = None
         state.text_encoder = None
+        state.warmed_up = False
 
     finally:
         state.loading = False
 
 
-def encode_text(prompt: str, max_text_len: int = 77):
+def find_checkpoint(model_dir: Path) -> Path:
+    """last.safetensors if it has been converted, else the Lightning last.ckpt"""
+    converted = model_dir / "last.safetensors"
+    return converted if converted.exists() else model_dir / "last.ckpt"
+
+
+def load_diffusion_model(config: Path, ckpt: Path, name: str):
+    """Load one XCube diffusion model onto state.device"""
+    logger.info(f"Loading {name} model from {ckpt}")
+    model = create_model_from_args(str(config), str(ckpt), device=state.device)
+    model = model.to(state.device)
+    model.eval()
+    return model
+
+
+def optimize_models(models: List[Tuple[str, Any]], text_encoder: bool):
+    """
+    Apply the configured weight casting, TensorRT engines, torch.compile or
+    CUDA graphs to the given diffusion models (and to CLIP if text_encoder).
+    """
+    if not CUDA_WORKS:
+        return
+    if os.getenv("XCUBE_HALF_WEIGHTS", "0") == "1":
+        cast_denoiser_weights(models)
+
+    # TensorRT-backed denoisers skip torch.compile and our CUDA graphs
+    trt_models = set()
+    if os.getenv("XCUBE_USE_TRT", "0") == "1":
+        trt_models = install_trt_engines(state.trt_dir, models)
+
+    if os.getenv("XCUBE_COMPILE", "0") == "1":
+        # reduce-overhead brings its own CUDA graphs; don't stack ours on top
+        state.use_cuda_graphs = False
+        compile_models(
+            os.getenv("XCUBE_COMPILE_MODE", "reduce-overhead"), skip=trt_models, models=models,
+            text_encoder=text_encoder,
+        )
+    elif state.use_cuda_graphs:
+        # Replay DDIM denoiser steps from CUDA graphs
+        for name, model in models:
+            if name not in trt_models:
+                install_step_graph(model, name)
+
+
+def get_fine_model():
+    """The fine model, loading it now if XCUBE_LAZY_FINE deferred it; None if unavailable"""
+    if state.fine_model is None and state.fine_checkpoint is not None:
+        with state.fine_lock:
+            if state.fine_model is None:
+                model = load_diffusion_model(*state.fine_checkpoint, "fine")
+                optimize_models([("fine", model)], text_encoder=False)
+                state.fine_model = model
+    return state.fine_model
+
+
+def warmup_models():
+    """
+    Run one short dummy inference so the first request doesn't pay for warmup.
+
+    Triggers cuBLAS/cuDNN handle creation, cudnn.benchmark algorithm selection,
+    torch.compile autotuning and denoiser graph capture before /health reports
+    ready.
+    """
+    logger.info("Warming up models (2 DDIM steps)")
+    start = time.time()
+    run_inference("", ddim_steps=2, use_fine=state.fine_model is not None)
+    torch.cuda.synchronize()
+    logger.info(f"Warmup complete in {time.time() - start:.1f}s")
+
+
+def upload_pinned(name: str, tensor: torch.Tensor) -> torch.Tensor:
+    """
+    Copy a small CPU tensor to the GPU through a reused pinned buffer.
+
+    The copy is non_blocking, so the following kernels launch while it is in
+    flight. Each buffer waits for its previous copy before being refilled.
+    """
+    with state.pinned_lock:
+        entry = state.pinned_inputs.get(name)
+        if entry is None or entry[0].numel() < tensor.numel() or entry[0].dtype != tensor.dtype:
+            entry = (torch.empty(max(tensor.numel(), 77), dtype=tensor.dtype, pin_memory=True), torch.cuda.Event())
+            state.pinned_inputs[name] = entry
+        staging, copied = entry
+        copied.synchronize()
+        staged = staging[:tensor.numel()].view(tensor.shape)
+        staged.copy_(tensor)
+        gpu = staged.to(state.device, non_blocking=True)
+        copied.record()
+    return gpu
+
+
+def fetch_to_host(*tensors: torch.Tensor) -> List[np.ndarray]:
+    """
+    Copy result tensors to float32 NumPy arrays with a single synchronization.
+
+    On CUDA each tensor is copied asynchronously into pinned memory, then the
+    stream is synchronized once before the arrays are handed out. Arrays are
+    always C-contiguous (sparse feature slices may be strided), which orjson
+    needs and which makes tobytes() a single memcpy.
+    """
+    if not CUDA_WORKS:
+        return [np.ascontiguousarray(t.detach().cpu().numpy(), dtype=np.float32) for t in tensors]
+    hosts = []
+    for t in tensors:
+        # Fresh contiguous buffer; copy_ gathers any strides on the GPU side
+        host = torch.empty(t.shape, dtype=torch.float32, pin_memory=True)
+        host.copy_(t.detach(), non_blocking=True)
+        hosts.append(host)
+    torch.cuda.current_stream().synchronize()
+    return [host.numpy() for host in hosts]
+
+
+def _encode_text_uncached(prompt: str, max_text_len: int = 77):
     """Encode text prompt using CLIP text encoder"""
+    # A compiled text model is specialized to one input shape, so pad every
+    # prompt to max_text_len there; eager runs only pad to the prompt's length
     inputs = state.clip_preprocess_fn(
         text=[prompt],
         return_tensors="pt",
-        padding=True,
+        padding="max_length" if state.text_compiled else True,
         max_length=max_text_len,
         truncation=True
     )
+    # Real tokens, counted on the host before the upload
+    num_tokens = int(inputs["attention_mask"].sum())
 
-    # Move to GPU if CUDA works
+    # Move to GPU if CUDA works: input_ids and attention_mask share shape and
+    # dtype, so they go up together in one async copy through pinned staging
     if CUDA_WORKS:
-        inputs = {k: v.cuda() for k, v in inputs.items()}
+        names = list(inputs.keys())
+        stacked = upload_pinned("clip_inputs", torch.stack([inputs[k] for k in names]))
+        inputs = dict(zip(names, stacked.unbind(0)))
 
-    with torch.no_grad():
+    # Half-precision and int8 weights run natively; autocast only helps fp32
+    autocast = inference_autocast() if state.text_encoder.dtype == torch.float32 else contextlib.nullcontext()
+    with torch.inference_mode(), autocast:
         text_embed_sd_model = state.text_encoder.text_model(**inputs)
-        text_emb = text_embed_sd_model.last_hidden_state[0]
-        text_emb, mask = padding_text_emb(text_emb, max_text_len=max_text_len)
+        # XCube consumes fp32 embeddings
+        text_emb = text_embed_sd_model.last_hidden_state[0, :num_tokens].float()
+
+    # Pad on the encoder's device into reused buffers, then copy out to host
+    # memory owned by the caller (pinned on CUDA for async uploads)
+    with state.padded_text_lock:
+        key = (max_text_len, text_emb.shape[1], text_emb.device)
+        bufs = state.padded_text_bufs.get(key)
+        if bufs is None:
+            bufs = (
+                torch.empty(max_text_len, text_emb.shape[1], device=text_emb.device),
+                torch.empty(max_text_len, dtype=torch.bool, device=text_emb.device),
+            )
+            state.padded_text_bufs[key] = bufs
+        padded_emb, padded_mask = padding_text_emb(text_emb, max_text_len=max_text_len, out=bufs)
+        text_emb = torch.empty(padded_emb.shape, dtype=padded_emb.dtype, pin_memory=CUDA_WORKS)
+        mask = torch.empty(padded_mask.shape, dtype=padded_mask.dtype, pin_memory=CUDA_WORKS)
+        text_emb.copy_(padded_emb)
+        mask.copy_(padded_mask)
 
     return text_emb, mask
 
 
-@torch.no_grad()
-def run_inference(
-    prompt: str,
+@functools.lru_cache(maxsize=int(os.getenv("XCUBE_TEXT_CACHE", "128")))
+def encode_text_cached(prompt: str, max_text_len: int = 77):
+    """
+    CLIP embedding and mask for a prompt, memoized on (prompt, max_text_len).
+
+    Entries are kept in pinned host memory so a hit costs one async upload.
+    Cleared whenever the models are (re)loaded.
+    """
+    return _encode_text_uncached(prompt, max_text_len)
+
+
+def batch_text_len(prompts: List[str], max_text_len: int = 77) -> int:
+    """
+    Token length a batch of prompts is padded to.
+
+    max_text_len by default; with XCUBE_DYNAMIC_TEXT_LEN=1 the batch's longest
+    prompt rounded up to a multiple of 8, so cross-attention skips the
+    padding tokens. Masks are cached on the host, so counting costs no GPU sync.
+    """
+    if not state.dynamic_text_len:
+        return max_text_len
+    longest = max(int(encode_text_cached(prompt, max_text_len)[1].sum()) for prompt in prompts)
+    return min(max_text_len, -(-longest // 8) * 8)
+
+
+def encode_text(prompt: str, max_text_len: int = 77, text_len: Optional[int] = None):
+    """Encode text prompt, reusing the cached embedding for repeat prompts; optionally trimmed to text_len tokens"""
+    text_emb, mask = encode_text_cached(prompt, max_text_len)
+    if text_len is not None:
+        # Leading rows of a contiguous pinned tensor stay contiguous and pinned
+        text_emb, mask = text_emb[:text_len], mask[:text_len]
+    return text_emb.to(state.device, non_blocking=True), mask.to(state.device, non_blocking=True)
+
+
+def point_cloud(output_x, res, index: int):
+    """
+    World-space positions and normals of one sample in a (batched) XCube output.
+
+    Positions are the grid_to_world affine map (ijk * voxel_size + origin)
+    applied in place on a single float copy of the voxel indices, instead of
+    allocating both ijk.float() and a transformed jagged tensor.
+    """
+    grid = output_x.grid[index]
+    xyz = grid.ijk.jdata.float().mul_(grid.voxel_sizes[0]).add_(grid.origins[0])
+    return xyz, res.normal_features[-1].feature[index].jdata
+
+
+def _run_inference_gpu_batch(
+    prompts: List[str],
     ddim_steps: int = 100,
     guidance_scale: float = 7.5,
     seed: Optional[int] = None,
     use_fine: bool = True
-) -> XCubeResult:
+) -> List[Dict[str, Optional[np.ndarray]]]:
     """
-    Run XCube inference on a text prompt.
+    Run XCube inference on prompts sharing sampler settings, stopping at host NumPy arrays.
+
+    The prompts' CLIP embeddings are stacked along the batch dimension, so
+    each model runs one evaluation_api call for the whole batch.
 
     Args:
-        prompt: Text description of the 3D object
+        prompts: Text descriptions of the 3D objects
         ddim_steps: Number of DDIM sampling steps
         guidance_scale: Classifier-free guidance strength
-        seed: Random seed (None for random)
+        seed: Random seed (None for random); only meaningful for a single prompt
         use_fine: Whether to run fine-resolution model
 
     Returns:
-        XCubeResult with point cloud data
+        Per prompt, a dict of coarse_xyz, coarse_normal, fine_xyz, fine_normal
+        arrays (fine entries are None without a fine pass)
     """
-    if not state.models_loaded:
+    # Checks the models directly so the startup warmup can run before ready
+    if state.coarse_model is None or state.text_encoder is None:
         raise RuntimeError("Models not loaded - check /health endpoint")
 
-    # Set random seed for reproducibility
-    if seed is not None:
-        torch.manual_seed(seed)
-        np.random.seed(seed)
-
-    # Encode text prompt
-    logger.info(f"Encoding prompt: '{prompt}'")
-    text_emb, text_mask = encode_text(prompt)
+    # Resolve the fine model first: a lazy load must neither draw from the
+    # request's seeded RNG nor create its weights as inference tensors
+    fine_model = get_fine_model() if use_fine else None
+
+    with seeded_rng(seed) as generator, torch.inference_mode():
+        return _sample_batch(prompts, ddim_steps, guidance_scale, use_fine, fine_model, generator)
+
+
+def _sample_batch(
+    prompts: List[str],
+    ddim_steps: int,
+    guidance_scale: float,
+    use_fine: bool,
+    fine_model,
+    generator: Optional[torch.Generator]
+) -> List[Dict[str, Optional[np.ndarray]]]:
+    """Body of _run_inference_gpu_batch, run inside the request's RNG scope"""
+    batch_size = len(prompts)
+
+    # Encode text prompts on their own stream, so one batch's CLIP forward can
+    # overlap another's denoising
+    for prompt in prompts:
+        logger.info(f"Encoding prompt: '{prompt}'")
+    with cuda_stream(state.text_stream):
+        text_len = batch_text_len(prompts)
+        encoded = [encode_text(prompt, text_len=text_len) for prompt in prompts]
+        text_emb = torch.stack([emb for emb, _ in encoded])
+        text_mask = torch.stack([mask for _, mask in encoded])
+    if state.diff_stream is not None:
+        # GPU-side barrier only; the CPU keeps queueing work
+        state.diff_stream.wait_stream(state.text_stream)
+        text_emb.record_stream(state.diff_stream)
+        text_mask.record_stream(state.diff_stream)
 
     cond_dict = {
-        'text_embed': text_emb.unsqueeze(0),  # Add batch dimension
-        'text_embed_mask': text_mask.unsqueeze(0)
+        'text_embed': text_emb,
+        'text_embed_mask': text_mask
     }
 
-    # Coarse generation
-    logger.info(f"Running coarse generation (DDIM steps: {ddim_steps}, guidance: {guidance_scale})")
-    res_coarse, output_x_coarse = state.coarse_model.evaluation_api(
-        batch_size=1,
-        use_ddim=True,
-        ddim_step=ddim_steps,
-        cond_dict=cond_dict,
-        guidance_scale=guidance_scale
-    )
+    with cuda_stream(state.diff_stream):
+        # Coarse generation
+        logger.info(f"Running coarse generation (batch: {batch_size}, DDIM steps: {ddim_steps}, "
+                    f"guidance: {guidance_scale})")
+        with inference_autocast():
+            res_coarse, output_x_coarse = state.coarse_model.evaluation_api(
+                batch_size=batch_size,
+                use_ddim=True,
+                ddim_step=ddim_steps,
+                cond_dict=cond_dict,
+                guidance_scale=guidance_scale,
+                **generator_kwargs(state.coarse_model, generator)
+            )
+
+        # Coarse point clouds stay on the GPU until the fine pass is queued
+        outputs = []
+        for i in range(batch_size):
+            outputs.extend(point_cloud(output_x_coarse, res_coarse, i))
+
+        # Fine generation (optional)
+        run_fine = fine_model is not None
+        if run_fine:
+            logger.info("Running fine generation")
+            with inference_autocast():
+                res_fine, output_x_fine = fine_model.evaluation_api(
+                    grids=output_x_coarse.grid,
+                    res_coarse=res_coarse,
+                    cond_dict=cond_dict,
+                    guidance_scale=guidance_scale,
+                    **generator_kwargs(fine_model, generator)
+                )
+
+            for i in range(batch_size):
+                outputs.extend(point_cloud(output_x_fine, res_fine, i))
+
+        elif use_fine:
+            logger.warning("Fine model requested but not available")
+
+        # Single CPU sync for the whole batch
+        arrays = fetch_to_host(*outputs)
+
+    results = []
+    for i in range(batch_size):
+        coarse_xyz, coarse_normal = arrays[2 * i], arrays[2 * i + 1]
+        fine_xyz = fine_normal = None
+        if run_fine:
+            fine_xyz, fine_normal = arrays[2 * (batch_size + i)], arrays[2 * (batch_size + i) + 1]
+
+        logger.info(f"Inference complete - coarse points: {len(coarse_xyz)}, "
+                    f"fine points: {len(fine_xyz) if fine_xyz is not None else 0}")
+
+        results.append({
+            "coarse_xyz": coarse_xyz,
+            "coarse_normal": coarse_normal,
+            "fine_xyz": fine_xyz,
+            "fine_normal": fine_normal,
+        })
+
+    return results
+
+
+def _run_inference_gpu(
+    prompt: str,
+    ddim_steps: int = 100,
+    guidance_scale: float = 7.5,
+    seed: Optional[int] = None,
+    use_fine: bool = True
+) -> Dict[str, Optional[np.ndarray]]:
+    """Run XCube inference on a single prompt (see _run_inference_gpu_batch)"""
+    return _run_inference_gpu_batch([prompt], ddim_steps, guidance_scale, seed, use_fine)[0]
 
-    # Extract coarse point cloud
-    coarse_xyz = output_x_coarse.grid.grid_to_world(
-        output_x_coarse.grid[0].ijk.float()
-    ).jdata.cpu().numpy()
 
-    coarse_normal = res_coarse.normal_features[-1].feature[0].jdata.cpu().numpy()
+def _to_xcube_result(arrays: Dict[str, Optional[np.ndarray]]) -> XCubeResult:
+    """Wrap inference arrays in an XCubeResult"""
+    # Arrays stay as numpy; skip validation so they are never boxed into lists
+    return XCubeResult.model_construct(**arrays)
 
-    result = XCubeResult(
-        coarse_xyz=coarse_xyz.tolist(),
-        coarse_normal=coarse_normal.tolist(),
-        fine_xyz=None,
-        fine_normal=None
-    )
 
-    # Fine generation (optional)
-    if use_fine and state.fine_model is not None:
-        logger.info("Running fine generation")
-        res_fine, output_x_fine = state.fine_model.evaluation_api(
-            grids=output_x_coarse.grid,
-            res_coarse=res_coarse,
-            cond_dict=cond_dict,
-            guidance_scale=guidance_scale
+def run_inference(
+    prompt: str,
+    ddim_steps: int = 100,
+    guidance_scale: float = 7.5,
+    seed: Optional[int] = None,
+    use_fine: bool = True
+) -> XCubeResult:
+    """Run XCube inference on a text prompt (see _run_inference_gpu)"""
+    return _to_xcube_result(_run_inference_gpu(prompt, ddim_steps, guidance_scale, seed, use_fine))
+
+
+def xcube_json_payload(result: XCubeResult) -> dict:
+    """
+    Convert an XCubeResult into data for ORJSONResponse.
+
+    NumPy arrays are passed through untouched; orjson serializes them natively
+    (OPT_SERIALIZE_NUMPY) without building Python lists first.
+    """
+    return {
+        "coarse_xyz": result.coarse_xyz,
+        "coarse_normal": result.coarse_normal,
+        "fine_xyz": result.fine_xyz,
+        "fine_normal": result.fine_normal,
+    }
+
+
+def xcube_binary_payload(result: XCubeResult) -> Tuple[bytes, dict]:
+    """
+    Pack an XCubeResult into a binary body and describing headers.
+
+    Body layout (little-endian float32, concatenated):
+    - coarse positions [X-Coarse-Count, 3]
+    - coarse normals [X-Coarse-Count, 3]
+    - fine positions [X-Fine-Count, 3], only if X-Has-Fine is 1
+    - fine normals [X-Fine-Count, 3], only if X-Has-Fine is 1
+    """
+    has_fine = result.fine_xyz is not None
+    parts = [
+        np.ascontiguousarray(result.coarse_xyz, dtype='<f4').tobytes(),
+        np.ascontiguousarray(result.coarse_normal, dtype='<f4').tobytes(),
+    ]
+    if has_fine:
+        parts.append(np.ascontiguousarray(result.fine_xyz, dtype='<f4').tobytes())
+        parts.append(np.ascontiguousarray(result.fine_normal, dtype='<f4').tobytes())
+    headers = {
+        "X-Coarse-Count": str(len(result.coarse_xyz)),
+        "X-Fine-Count": str(len(result.fine_xyz)) if has_fine else "0",
+        "X-Has-Fine": "1" if has_fine else "0",
+        "X-Dtype": "float32",
+    }
+    return b"".join(parts), headers
+
+
+class GenerateBatcher:
+    """
+    Coalesces concurrent /generate requests into batched evaluation_api runs.
+
+    While a batch runs, new requests queue up; the worker then waits at most
+    `max_delay` seconds (or until `max_batch` are pending) and groups requests
+    sharing sampler parameters. Seeded requests always run alone so their
+    output does not depend on what else was in flight.
+    """
+
+    def __init__(self, max_batch: int = 4, max_delay: float = 0.05, concurrency: int = 1):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # Groups running at once on the GPU
+        self.slots = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+
+    async def submit(self, request: GenerateRequest) -> Dict[str, Optional[np.ndarray]]:
+        """Queue a request and wait for its result arrays"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        return await future
+
+    async def run(self):
+        """Worker loop: collect pending requests and run them in groups"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for item in pending:
+                request = item[0]
+                key = (
+                    request.ddim_steps,
+                    request.guidance_scale,
+                    request.use_fine,
+                    # Seeded requests are never coalesced
+                    id(item) if request.seed is not None else None,
+                )
+                groups.setdefault(key, []).append(item)
+
+            # Wait for a free slot per group; requests arriving meanwhile
+            # queue up for the next batch
+            for group in groups.values():
+                await self.slots.acquire()
+                task = asyncio.create_task(self._run_group(group))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+    async def _run_group(self, group):
+        """Run one group on the GPU and resolve its futures"""
+        requests = [request for request, _ in group]
+        try:
+            results = await asyncio.to_thread(run_group, requests)
+        except Exception as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.slots.release()
+
+        for (_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+
+def release_cached_memory():
+    """
+    Return cached CUDA blocks to the driver when fragmentation builds up.
+
+    empty_cache() synchronizes and makes the next request re-allocate, so
+    it only runs once reserved-but-unallocated memory exceeds
+    XCUBE_EMPTY_CACHE_MB (default 1024).
+    """
+    if not CUDA_WORKS:
+        return
+    slack = torch.cuda.memory_reserved() - torch.cuda.memory_allocated()
+    if slack > int(os.getenv("XCUBE_EMPTY_CACHE_MB", "1024")) * 1024 * 1024:
+        torch.cuda.empty_cache()
+        logger.info(f"Released {slack / 2**20:.0f} MB of cached CUDA memory")
+
+
+def run_group(requests: List[GenerateRequest]) -> List[Dict[str, Optional[np.ndarray]]]:
+    """Run a batcher group (requests share ddim_steps, guidance_scale and use_fine)"""
+    first = requests[0]
+    try:
+        return _run_inference_gpu_batch(
+            [request.prompt for request in requests],
+            ddim_steps=first.ddim_steps,
+            guidance_scale=first.guidance_scale,
+            seed=first.seed,
+            use_fine=first.use_fine
         )
+    finally:
+        release_cached_memory()
+
 
-        fine_xyz = output_x_fine.grid.grid_to_world(
-            output_x_fine.grid[0].ijk.float()
-        ).jdata.cpu().numpy()
+def json_response(arrays: Dict[str, Optional[np.ndarray]]) -> ORJSONResponse:
+    """
+    Build the /generate response.
 
-        fine_normal = res_fine.normal_features[-1].feature[0].jdata.cpu().numpy()
+    ORJSONResponse renders its body in the constructor, so this runs in a
+    worker thread rather than on the event loop or the GPU thread.
+    """
+    return ORJSONResponse(xcube_json_payload(_to_xcube_result(arrays)))
 
-        result.fine_xyz = fine_xyz.tolist()
-        result.fine_normal = fine_normal.tolist()
 
-    elif use_fine:
-        logger.warning("Fine model requested but not available")
+def binary_response(arrays: Dict[str, Optional[np.ndarray]]) -> Response:
+    """Build the /generate_binary response (packing runs in a worker thread)"""
+    content, headers = xcube_binary_payload(_to_xcube_result(arrays))
+    return Response(content=content, media_type="application/octet-stream", headers=headers)
 
-    logger.info(f"Inference complete - coarse points: {len(coarse_xyz)}, "
-                f"fine points: {len(result.fine_xyz) if result.fine_xyz else 0}")
 
-    return result
+def check_models_ready():
+    """Raise 503 unless the models are loaded"""
+    if not state.models_loaded:
+        if state.loading:
+            raise HTTPException(status_code=503, detail="Models still loading - try again in a moment")
+        else:
+            raise HTTPException(status_code=503, detail=f"Models failed to load: {state.error}")
 
 
 # API endpoints
@@ -336,6 +1270,13 @@ def run_inference(
 async def startup_event():
     """Initialize server on startup"""
     logger.info("XCube Inference Server starting...")
+    state.batcher = GenerateBatcher(
+        max_batch=int(os.getenv("XCUBE_MAX_BATCH", "4")),
+        max_delay=int(os.getenv("XCUBE_BATCH_WAIT_MS", "50")) / 1000.0,
+        # Groups in flight on the GPU at once; each holds a full diffusion run's memory
+        concurrency=int(os.getenv("XCUBE_GPU_CONCURRENCY", "1")),
+    )
+    asyncio.create_task(state.batcher.run())
     asyncio.create_task(load_models())
 
 
@@ -384,22 +1325,35 @@ async def generate(request: GenerateRequest):
     }
     ```
     """
-    if not state.models_loaded:
-        if state.loading:
-            raise HTTPException(status_code=503, detail="Models still loading - try again in a moment")
-        else:
-            raise HTTPException(status_code=503, detail=f"Models failed to load: {state.error}")
+    check_models_ready()
 
     try:
-        result = await asyncio.to_thread(
-            run_inference,
-            prompt=request.prompt,
-            ddim_steps=request.ddim_steps,
-            guidance_scale=request.guidance_scale,
-            seed=request.seed,
-            use_fine=request.use_fine
-        )
-        return result
+        # Concurrent requests are coalesced into batched denoiser runs
+        arrays = await state.batcher.submit(request)
+        # Serialized on its own thread so the GPU is free for the next batch;
+        # returned directly so FastAPI skips re-validating the arrays
+        return await asyncio.to_thread(json_response, arrays)
+
+    except Exception as e:
+        logger.error(f"Inference failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Inference failed: {str(e)}")
+
+
+@app.post("/generate_binary")
+async def generate_binary(request: GenerateRequest):
+    """
+    Generate 3D point cloud and return it as packed binary.
+
+    Same inputs as /generate, but skips JSON encoding entirely: the body is
+    raw little-endian float32 arrays (see xcube_binary_payload) and the point
+    counts travel in X-* headers.
+    """
+    check_models_ready()
+
+    try:
+        # Concurrent requests are coalesced into batched denoiser runs
+        arrays = await state.batcher.submit(request)
+        return await asyncio.to_thread(binary_response, arrays)
 
     except Exception as e:
         logger.error(f"Inference failed: {e}", exc_info=True)
@@ -419,6 +1373,33 @@ async def root():
     )
 
 
+def run_gpu_servers(count: int, host: str, port: int):
+    """
+    Launch one single-worker server per GPU and wait for them.
+
+    Server i sees only its own GPU (CUDA_VISIBLE_DEVICES) and listens on
+    port + i, so every process owns one device and one batcher; put a load
+    balancer in front of the ports.
+    """
+    import subprocess
+
+    visible = os.getenv("CUDA_VISIBLE_DEVICES")
+    devices = visible.split(",") if visible else [str(i) for i in range(count)]
+    procs = []
+    for i in range(count):
+        env = dict(os.environ, CUDA_VISIBLE_DEVICES=devices[i], XCUBE_PORT=str(port + i), XCUBE_WORKERS="1")
+        logger.info(f"Starting server for GPU {devices[i]} on {host}:{port + i}")
+        procs.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env))
+    try:
+        for proc in procs:
+            proc.wait()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -427,12 +1408,34 @@ if __name__ == "__main__":
     port = int(os.getenv("XCUBE_PORT", "8000"))
     workers = int(os.getenv("XCUBE_WORKERS", "1"))
 
-    logger.info(f"Starting server on {host}:{port} with {workers} workers")
-
-    uvicorn.run(
-        "server:app",
-        host=host,
-        port=port,
-        workers=workers,
-        log_level="info"
-    )
+    # Each worker loads its own copy of the models; never share a GPU
+    gpu_count = torch.cuda.device_count()
+    if gpu_count and workers > gpu_count:
+        logger.warning(f"XCUBE_WORKERS={workers} exceeds {gpu_count} GPU(s) - clamping to {gpu_count}")
+        workers = gpu_count
+
+    # Cap open connections (excess get 503) so requests can't pile up unbounded
+    limit_concurrency = int(os.getenv("XCUBE_LIMIT_CONCURRENCY", "0")) or None
+    backlog = int(os.getenv("XCUBE_BACKLOG", "2048"))
+
+    # uvloop and httptools come with uvicorn[standard]; fall back without them
+    import importlib.util
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+    if gpu_count and workers > 1:
+        run_gpu_servers(workers, host, port)
+    else:
+        logger.info(f"Starting server on {host}:{port} with {workers} workers ({loop}, {http})")
+
+        uvicorn.run(
+            "server:app",
+            host=host,
+            port=port,
+            workers=workers,
+            loop=loop,
+            http=http,
+            limit_concurrency=limit_concurrency,
+            backlog=backlog,
+            log_level="info"
+        )